@@ -1,22 +1,150 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS  # 处理跨域请求
+import io
 import os
-from models.demo import process  # 核心处理逻辑
-from utils.file_processing import save_file, delete_file  # 文件处理工具
+import json
+import zipfile
+import threading
+from zlib import adler32
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from models import ocr_engine  # OCR 模型懒加载与实例池
+from models.demo import (process, iter_process, process_instances, iter_process_instances,  # 核心处理逻辑
+                         compile_template, compile_fingerprint)
+from models.template_cache import TemplateCache  # 已编译模板缓存
+from utils.file_processing import SpooledRequest  # 文件处理工具
+from utils.pdf_utils import PdfDocument, read_upload  # 上传文件直接在内存中解析
+from utils.job_queue import JobQueue  # 异步任务队列
+from utils.result_store import ResultStore  # 按请求保存的处理结果
+from utils import metrics  # 分阶段耗时统计
 
 # 创建 Flask 应用
 app = Flask(__name__)
+app.request_class = SpooledRequest
 
 # 启用 CORS 支持
-CORS(app, resources={r"/process": {"origins": "*"}})
+CORS(app, resources={r"/process*": {"origins": "*"}, r"/batch": {"origins": "*"}, r"/templates*": {"origins": "*"},
+                     r"/jobs*": {"origins": "*"}},
+     expose_headers=["X-Result-Id"])
 
-# 配置上传目录和输出文件路径
+# 配置上传目录
 UPLOAD_DIR = 'uploads'
-OUTPUT_FILE = 'output.json'
+
+# 配置结果存储目录、保留时间与压缩方式（gzip / zstd / none）
+RESULT_DIR = os.environ.get('RESULT_DIR', 'results')
+RESULT_TTL = int(os.environ.get('RESULT_TTL', 3600))
+RESULT_COMPRESSION = os.environ.get('RESULT_COMPRESSION', 'gzip')
+
+# 配置模板缓存目录及容量
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', 'template_cache')
+TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', 32))
+TEMPLATE_CACHE_DISK_SIZE = int(os.environ.get('TEMPLATE_CACHE_DISK_SIZE', 256))
+
+# 配置异步任务的存储位置与工作线程数
+JOB_DIR = os.environ.get('JOB_DIR', 'jobs')
+JOB_DB = os.environ.get('JOB_DB', os.path.join(JOB_DIR, 'jobs.db'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# 批量处理时同时处理的扫描件数量。各扫描件的渲染与矫正送入同样大小的共享进程池（PyMuPDF 不是线程安全的，
+# 线程内处理只会在 GIL 上排队），OCR 实例池也扩容到同样数量（按需加载，每个实例各占一份模型内存）
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+
+# 多实例扫描件的切分方式：fixed 按模板页数依次切分，detect 按页面相似度识别实例边界
+INSTANCE_MODES = ('fixed', 'detect')
+
+# 是否允许通过 ?profile=cprofile|pyinstrument 对单个请求做性能分析；任何客户端都能触发，默认关闭，
+# 仅在排查性能问题时设置 ALLOW_PROFILING=1
+ALLOW_PROFILING = os.environ.get('ALLOW_PROFILING', '0') == '1'
+
+# 启动后是否在后台线程中预加载 OCR 模型（不阻塞服务启动）
+OCR_PRELOAD = os.environ.get('OCR_PRELOAD', '0') == '1'
 
 # 确保上传目录存在
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+template_cache = TemplateCache(TEMPLATE_CACHE_DIR, TEMPLATE_CACHE_SIZE, TEMPLATE_CACHE_DISK_SIZE)
+result_store = ResultStore(
+    RESULT_DIR, ttl=RESULT_TTL,
+    compression=None if RESULT_COMPRESSION == 'none' else RESULT_COMPRESSION,
+)
+
+
+def check_upload_request():
+    """
+    校验 /process 与 /jobs 的上传字段。
+    模板既可以通过 templateFile 上传，也可以通过 templateId 引用已注册的模板。
+    :return: (scan_file, template_file, template_id, 错误响应)，校验通过时错误响应为 None
+    """
+    template_id = request.form.get('templateId')
+
+    # 检查是否提供了必要的文件字段
+    if 'scanFile' not in request.files or ('templateFile' not in request.files and not template_id):
+        return None, None, None, (jsonify({"error": "Missing file part"}), 400)
+
+    scan_file = request.files['scanFile']
+    template_file = None if template_id else request.files['templateFile']
+
+    # 检查文件名是否为空
+    if scan_file.filename == '' or (template_file and template_file.filename == ''):
+        return None, None, None, (jsonify({"error": "No selected file"}), 400)
+
+    # 检查文件类型是否为 PDF
+    if not scan_file.filename.endswith('.pdf') or (template_file and not template_file.filename.endswith('.pdf')):
+        return None, None, None, (jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400)
+
+    # 检查多实例切分方式
+    if request.args.get('instances', INSTANCE_MODES[0]) not in INSTANCE_MODES:
+        return None, None, None, (jsonify({"error": f"Unknown instances mode: {request.args['instances']}"}), 400)
+
+    return scan_file, template_file, template_id, None
+
+
+def resolve_template(template_id=None, template_path=None, name=None):
+    """
+    获取已编译模板：给定 template_id 时从缓存读取，否则按模板内容哈希查找或编译。
+    词表、分行容差等编译输入变化后（见 compile_fingerprint），缓存的编译结果按缓存中的模板原文件重新编译。
+    :param template_path: 模板 PDF 路径或已打开的 PdfDocument
+    :return: (模板哈希, 缓存中的模板 PDF 路径, 编译结果)
+    :raises LookupError: template_id 对应的模板不存在
+    """
+    fingerprint = compile_fingerprint()
+    if template_path is None:
+        compiled = template_cache.get(template_id)
+        if compiled is None:
+            raise LookupError(f"Template {template_id} not found")
+        if not template_cache.is_current(compiled, fingerprint):
+            cached_path = template_cache.template_path(template_id)
+            if cached_path is None:
+                raise LookupError(f"Template {template_id} not found")
+            template_id, compiled = template_cache.get_or_compile(cached_path, compile_template,
+                                                                  fingerprint=fingerprint)
+    else:
+        template_id, compiled = template_cache.get_or_compile(template_path, compile_template, name=name,
+                                                              fingerprint=fingerprint)
+    return template_id, template_cache.template_path(template_id), compiled
+
+
+def run_job(job, progress):
+    """
+    异步任务处理函数，由任务队列的工作线程调用。
+    """
+    params = job["params"]
+    files = params["files"]
+    template_id, cached_template_path, compiled = resolve_template(
+        params.get("template_id"), files.get("template"), params.get("template_name")
+    )
+    if params.get("instances"):
+        return process_instances(cached_template_path, files["scan"], compiled=compiled,
+                                 detect=params["instances"] == 'detect', progress=progress)
+    return process(cached_template_path, files["scan"], compiled=compiled, progress=progress)
+
+
+job_queue = JobQueue(JOB_DB, JOB_DIR, run_job, workers=JOB_WORKERS, result_store=result_store, ttl=RESULT_TTL)
+job_queue.start()
+
+if OCR_PRELOAD:
+    threading.Thread(target=ocr_engine.get_engine().warm_up, daemon=True).start()
+
 @app.route('/')
 def index():
     return "Welcome to the PDF Processing Service!"
@@ -25,36 +153,70 @@ def index():
 def process_files():
     """
     处理文件上传和逻辑处理的 API 路由。
+    模板既可以通过 templateFile 上传，也可以通过 templateId 引用已注册的模板。
+    查询参数 instances=fixed|detect 时扫描件视为多份模板实例，返回各实例的逻辑树列表（见 process_instances）；
+    timings=1 时返回 {"result": 结果, "timings": 分阶段耗时}；
+    profile=cprofile|pyinstrument 时额外返回该请求的性能分析报告。
     """
+    scan_pdf = None
+    template_pdf = None
     try:
-        # 检查是否提供了必要的文件字段
-        if 'scanFile' not in request.files or 'templateFile' not in request.files:
-            return jsonify({"error": "Missing file part"}), 400
+        scan_file, template_file, template_id, error = check_upload_request()
+        if error:
+            return error
 
-        scan_file = request.files['scanFile']
-        template_file = request.files['templateFile']
+        want_timings = request.args.get('timings') == '1'
+        instances_mode = request.args.get('instances')
+        profiler = request.args.get('profile')
+        if profiler:
+            if not ALLOW_PROFILING:
+                return jsonify({"error": "Profiling is disabled"}), 403
+            if profiler not in metrics.PROFILERS:
+                return jsonify({"error": f"Unknown profiler: {profiler}"}), 400
+            if profiler == 'pyinstrument' and metrics.pyinstrument is None:
+                return jsonify({"error": "pyinstrument is not installed"}), 400
 
-        # 检查文件名是否为空
-        if scan_file.filename == '' or template_file.filename == '':
-            return jsonify({"error": "No selected file"}), 400
-
-        # 检查文件类型是否为 PDF
-        if not (scan_file and scan_file.filename.endswith('.pdf') and template_file and template_file.filename.endswith('.pdf')):
-            return jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400
+        # 上传文件直接在内存中解析并校验，同一个文档对象一直传到处理流程，不写入 uploads 目录
+        scan_pdf = read_upload(scan_file)
+        if template_file:
+            template_pdf = read_upload(template_file)
 
-        # 保存上传的文件
-        scan_path = save_file(scan_file, UPLOAD_DIR)
-        template_path = save_file(template_file, UPLOAD_DIR)
+        def run():
+            # 按模板内容哈希查找编译结果，重复上传的模板不再重新抽取表格
+            _, cached_template_path, compiled = resolve_template(
+                template_id, template_pdf, template_file.filename if template_file else None
+            )
+            # 调用核心处理逻辑
+            if instances_mode:
+                return process_instances(template_pdf or cached_template_path, scan_pdf, compiled=compiled,
+                                         detect=instances_mode == 'detect')
+            return process(template_pdf or cached_template_path, scan_pdf, compiled=compiled)
 
-        # 调用核心处理逻辑
-        result = process(template_path, scan_path)
+        # 模板编译与扫描件处理的耗时都计入本次请求
+        profile_report = None
+        try:
+            with metrics.track_request() as timings:
+                if profiler:
+                    result, profile_report = metrics.profile_call(profiler, run)
+                else:
+                    result = run()
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        if result is None:
+            raise RuntimeError("处理流程未返回结果")
 
-        # 将结果保存为 JSON 文件
-        with open(OUTPUT_FILE, 'w', encoding = 'utf-8') as f:
-            import json
-            json.dump(result, f, indent=4, ensure_ascii= False)
+        # 将结果保存到本次请求独立的结果文件，通过 X-Result-Id 告知下载地址
+        result_id = result_store.save(result)
 
-        return jsonify(result)  # 返回处理结果
+        if want_timings or profiler:
+            body = {"result": result, "timings": timings.to_dict()}
+            if profile_report is not None:
+                body["profile"] = profile_report
+            response = jsonify(body)
+        else:
+            response = jsonify(result)  # 返回处理结果
+        response.headers['X-Result-Id'] = result_id
+        return response
 
     except Exception as e:
         # 捕获异常并返回错误信息
@@ -62,26 +224,418 @@ def process_files():
         return jsonify({"error": str(e)}), 500
 
     finally:
-        # 删除临时文件
-        delete_file(scan_path)
-        delete_file(template_path)
+        # 关闭已解析的上传文档
+        if scan_pdf:
+            scan_pdf.close()
+        if template_pdf:
+            template_pdf.close()
 
 
-@app.route('/download', methods=['GET'])
-def download():
+@app.route('/process/stream', methods=['POST'])
+def process_stream():
     """
-    提供下载处理结果的 API 路由。
+    流式处理：与 /process 的参数相同，每处理完一页即输出该页的逻辑树，
+    服务端同时只保留正在处理的页面图像。
+    默认以 NDJSON 输出，查询参数 format=sse 时以 server-sent events 输出。
+    每页一条 {"page": 页码, "result": 该页逻辑树}，结束时输出 {"done": true, "pages": 页数}，
+    出错时输出 {"error": 错误信息}。
+    查询参数 instances=fixed|detect 时改为每份实例一条 {"instance": 实例序号, "pages": 扫描页码列表, "result": 逻辑树}，
+    结束时输出 {"done": true, "instances": 实例数}。
     """
-    if os.path.exists(OUTPUT_FILE):
-        return send_file(
-            OUTPUT_FILE,
-            as_attachment=True,
-            mimetype='application/json;charset=utf-8',  # 设置 MIME 类型和编码
-            download_name='result.json'  # 下载文件名
+    scan_pdf = None
+    template_pdf = None
+    try:
+        scan_file, template_file, template_id, error = check_upload_request()
+        if error:
+            return error
+
+        # 响应开始流式输出前上传文件就会被关闭，扫描件在此解析为文档
+        scan_pdf = read_upload(scan_file)
+        if template_file:
+            template_pdf = read_upload(template_file)
+        try:
+            _, cached_template_path, compiled = resolve_template(
+                template_id, template_pdf, template_file.filename if template_file else None
+            )
+        except LookupError as e:
+            scan_pdf.close()
+            return jsonify({"error": str(e)}), 404
+        finally:
+            # 编译结果已缓存，处理时只需要缓存中的模板路径
+            if template_pdf:
+                template_pdf.close()
+
+    except Exception as e:
+        if scan_pdf:
+            scan_pdf.close()
+        print(f"Error processing files: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    sse = request.args.get('format') == 'sse'
+    instances_mode = request.args.get('instances')
+
+    def event(name, record):
+        data = json.dumps(record, ensure_ascii=False)
+        return f"event: {name}\ndata: {data}\n\n" if sse else data + "\n"
+
+    def generate_instances():
+        count = 0
+        try:
+            for index, pages, logic_tree in iter_process_instances(cached_template_path, scan_pdf, compiled=compiled,
+                                                                   detect=instances_mode == 'detect'):
+                count += 1
+                yield event("instance", {"instance": index, "pages": pages, "result": logic_tree})
+            yield event("done", {"done": True, "instances": count})
+        except Exception as e:
+            print(f"Error streaming results: {e}")
+            yield event("error", {"error": str(e)})
+        finally:
+            scan_pdf.close()
+
+    def generate():
+        pages = 0
+        try:
+            for page_num, page_tree in iter_process(cached_template_path, scan_pdf, compiled=compiled):
+                pages += 1
+                yield event("page", {"page": page_num, "result": page_tree})
+            yield event("done", {"done": True, "pages": pages})
+        except Exception as e:
+            print(f"Error streaming results: {e}")
+            yield event("error", {"error": str(e)})
+        finally:
+            scan_pdf.close()
+
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    stream = generate_instances() if instances_mode else generate()
+    return Response(stream_with_context(stream), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+
+
+def load_batch_upload(scan_file):
+    """
+    解析批量请求中的单个扫描件，解析失败时返回异常而不是抛出，以便单独报告该文件。
+    :return: (文件名, PdfDocument 或 ValueError)
+    """
+    try:
+        return scan_file.filename, read_upload(scan_file)
+    except ValueError as e:
+        return scan_file.filename, e
+
+
+def iter_batch_scans(uploads, archive=None):
+    """
+    依次列出批量请求中的扫描件，zip 包中的 PDF 在取用时才解压。
+    :param uploads: load_batch_upload 的结果列表
+    :param archive: 包含扫描件的 zipfile.ZipFile，可选
+    :return: 生成 (文件名, PdfDocument 或异常)
+    """
+    yield from uploads
+
+    if archive:
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.pdf'):
+                    continue
+                try:
+                    yield info.filename, PdfDocument(archive.read(info), name=info.filename)
+                except (ValueError, zipfile.BadZipFile) as e:
+                    yield info.filename, e
+
+
+def run_batch_item(template_path, compiled, scan_pdf):
+    """
+    批量处理中的单个扫描件：处理并保存结果，完成后关闭文档。
+    :return: (结果, 结果 id)
+    """
+    try:
+        result = process(template_path, scan_pdf, compiled=compiled, workers=BATCH_WORKERS)
+    finally:
+        scan_pdf.close()
+    if result is None:
+        raise RuntimeError("处理流程未返回结果")
+    return result, result_store.save(result)
+
+
+@app.route('/batch', methods=['POST'])
+def process_batch():
+    """
+    批量处理：一个模板（templateFile 上传或 templateId 引用）对应多个扫描件
+    （多个 scanFile 字段和/或一个 scanZip 压缩包）。
+    模板只编译一次，扫描件以有限并发处理，每完成一个即以 NDJSON 输出一行结果。
+    """
+    template_pdf = None
+    try:
+        template_id = request.form.get('templateId')
+        template_file = None if template_id else request.files.get('templateFile')
+        scan_files = [f for f in request.files.getlist('scanFile') if f.filename]
+        zip_file = request.files.get('scanZip')
+
+        if (not template_id and not template_file) or (not scan_files and not zip_file):
+            return jsonify({"error": "Missing file part"}), 400
+        if template_file and not template_file.filename.endswith('.pdf'):
+            return jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400
+        if any(not f.filename.endswith('.pdf') for f in scan_files):
+            return jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400
+        if zip_file and not zipfile.is_zipfile(zip_file.stream):
+            return jsonify({"error": "Invalid zip archive"}), 400
+
+        # 响应开始流式输出前上传文件就会被关闭：扫描件在此解析为文档，
+        # zip 包只复制压缩数据，其中的 PDF 在处理时逐个解压
+        uploads = [load_batch_upload(scan_file) for scan_file in scan_files]
+        archive = None
+        if zip_file:
+            zip_file.stream.seek(0)
+            archive = zipfile.ZipFile(io.BytesIO(zip_file.stream.read()))
+
+        if template_file:
+            template_pdf = read_upload(template_file)
+        try:
+            template_id, cached_template_path, compiled = resolve_template(
+                template_id, template_pdf, template_file.filename if template_file else None
+            )
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        finally:
+            # 编译结果已缓存，各扫描件的处理只需要缓存中的模板路径
+            if template_pdf:
+                template_pdf.close()
+
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    def line(record):
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def generate():
+        yield line({"template_id": template_id, "page_count": compiled["page_count"]})
+        done = failed = 0
+        pending = {}
+
+        def collect(return_when):
+            nonlocal done, failed
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                index, name = pending.pop(future)
+                try:
+                    result, result_id = future.result()
+                    done += 1
+                    yield line({"index": index, "name": name, "status": "done",
+                                "result_id": result_id, "result": result})
+                except Exception as e:
+                    failed += 1
+                    yield line({"index": index, "name": name, "status": "failed", "error": str(e)})
+
+        ocr_engine.get_engine().reserve(BATCH_WORKERS)
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            for index, (name, scan_pdf) in enumerate(iter_batch_scans(uploads, archive)):
+                if isinstance(scan_pdf, Exception):
+                    failed += 1
+                    yield line({"index": index, "name": name, "status": "failed", "error": str(scan_pdf)})
+                    continue
+
+                pending[pool.submit(run_batch_item, cached_template_path, compiled, scan_pdf)] = (index, name)
+                # 同时在处理中的扫描件不超过 BATCH_WORKERS 个，后面的扫描件在有空位时才解析
+                if len(pending) >= BATCH_WORKERS:
+                    yield from collect(FIRST_COMPLETED)
+
+            while pending:
+                yield from collect(FIRST_COMPLETED)
+
+        yield line({"done": done, "failed": failed})
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    提交异步处理任务：保存上传文件后立即返回任务 id。
+    """
+    try:
+        scan_file, template_file, template_id, error = check_upload_request()
+        if error:
+            return error
+        if template_id and not template_cache.template_path(template_id):
+            return jsonify({"error": f"Template {template_id} not found"}), 404
+
+        files = {"scan": scan_file}
+        if template_file:
+            files["template"] = template_file
+
+        job_id = job_queue.submit(files, {
+            "template_id": template_id,
+            "template_name": template_file.filename if template_file else None,
+            "instances": request.args.get('instances'),
+        })
+        return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": f"/jobs/{job_id}"}
+
+    except Exception as e:
+        print(f"Error submitting job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    查询任务状态与进度（已处理页数 / 总页数）。
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    获取任务结果：完成时返回结果 JSON，未完成时返回 202 与当前状态。
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == 'failed':
+        return jsonify({"error": job["error"], "status": job["status"]}), 500
+    if job["status"] != 'done':
+        return jsonify(job), 202
+    if job["result_id"]:
+        return send_result(job["result_id"], as_attachment=False)
+    return jsonify(job_queue.result(job_id))
+
+
+@app.route('/templates', methods=['POST'])
+def register_template():
+    """
+    预注册模板：编译上传的模板并写入缓存，返回模板 id。
+    """
+    template_pdf = None
+    try:
+        if 'templateFile' not in request.files:
+            return jsonify({"error": "Missing file part"}), 400
+
+        template_file = request.files['templateFile']
+        if template_file.filename == '':
+            return jsonify({"error": "No selected file"}), 400
+        if not template_file.filename.endswith('.pdf'):
+            return jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400
+
+        template_pdf = read_upload(template_file)
+        template_id, compiled = template_cache.get_or_compile(
+            template_pdf, compile_template, name=template_file.filename, fingerprint=compile_fingerprint()
         )
-    else:
+        return jsonify({"template_id": template_id, "page_count": compiled["page_count"]}), 201
+
+    except Exception as e:
+        print(f"Error registering template: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if template_pdf:
+            template_pdf.close()
+
+
+@app.route('/templates', methods=['GET'])
+def list_templates():
+    """
+    列出已编译的模板。
+    """
+    return jsonify(template_cache.list())
+
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """
+    以 Prometheus 文本格式导出各处理阶段的累计耗时、调用次数、OCR 实例池与结果缓存状态。
+    """
+    ocr_stats = ocr_engine.get_engine().stats()
+    gauges = {
+        "ocr_instances_loaded": ocr_stats["loaded"],
+        "ocr_instances_in_use": ocr_stats["in_use"],
+        "ocr_queue_depth": ocr_stats["queue_depth"],
+    }
+    if ocr_stats["cache"]:
+        gauges["ocr_cache_entries"] = ocr_stats["cache"]["entries"]
+        gauges["ocr_cache_hit_rate"] = ocr_stats["cache"]["hit_rate"]
+    return Response(metrics.REGISTRY.to_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/ocr/status', methods=['GET'])
+def ocr_status():
+    """
+    查看 OCR 实例池状态：已加载实例数、模型加载耗时、排队数量与结果缓存命中情况。
+    """
+    return jsonify(ocr_engine.get_engine().stats())
+
+
+@app.route('/templates/<template_id>', methods=['DELETE'])
+def evict_template(template_id):
+    """
+    从缓存中删除指定模板。
+    """
+    if template_cache.evict(template_id):
+        return jsonify({"template_id": template_id, "evicted": True})
+    return jsonify({"error": "Template not found"}), 404
+
+
+def send_result(result_id, as_attachment=True):
+    """
+    发送已保存的结果文件，支持 ETag / Range。
+    压缩保存的结果在客户端支持对应编码时直接发送压缩文件，否则解压后流式返回；
+    解压返回时沿用 send_file 按存储文件计算的 ETag，Range 按解压后的字节偏移处理。
+    """
+    path, compression = result_store.locate(result_id)
+    if path is None:
         return jsonify({"error": "File not found"}), 404
 
+    if compression is None or compression in request.accept_encodings:
+        response = send_file(
+            path,
+            as_attachment=as_attachment,
+            mimetype='application/json;charset=utf-8',  # 设置 MIME 类型和编码
+            download_name='result.json',  # 下载文件名
+            conditional=True,
+        )
+        if compression:
+            response.headers['Content-Encoding'] = compression
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    headers = {'Content-Disposition': 'attachment; filename=result.json'} if as_attachment else {}
+    headers['Vary'] = 'Accept-Encoding'
+    stream = result_store.open(result_id)
+    response = Response(wrap_file(request.environ, stream), mimetype='application/json;charset=utf-8',
+                        headers=headers, direct_passthrough=True)
+    # 与 send_file 相同的 ETag：存储文件的修改时间、大小与路径校验和
+    stat = os.stat(path)
+    response.set_etag(f"{stat.st_mtime}-{stat.st_size}-{adler32(path.encode()) & 0xFFFFFFFF}")
+    response.last_modified = stat.st_mtime
+    response.cache_control.no_cache = True
+    # 解压后的长度只在处理 Range 请求时才需要
+    complete_length = result_store.size(result_id) if request.range else None
+    response.make_conditional(request, accept_ranges=True, complete_length=complete_length)
+    if response.status_code in (304, 412):
+        stream.close()
+        response.response = []
+    return response
+
+
+@app.route('/download', methods=['GET'])
+def download_latest():
+    """
+    旧版下载路由：结果曾保存在同一个文件中，现在每个请求的结果单独保存，须按结果 id 下载。
+    """
+    return jsonify({
+        "error": "Results are stored per request; download them from /download/<result_id> "
+                 "using the X-Result-Id header returned by /process"
+    }), 410
+
+
+@app.route('/download/<result_id>', methods=['GET'])
+def download(result_id):
+    """
+    提供下载处理结果的 API 路由。
+    """
+    return send_result(result_id)
+
 
 if __name__ == '__main__':
     """
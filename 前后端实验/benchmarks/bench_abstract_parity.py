@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+模板抽取回归对照：在同一页上分别运行 details_abstract.abstract（每页检测一次表格）
+与 abstract_legacy（原有的逐单元格裁剪实现），检查两者的 fixed_area / unfixed_area / 表格范围是否一致，
+并比较每页耗时。
+用法（在项目根目录下）：python -m benchmarks.bench_abstract_parity [模板.pdf ...]
+不指定模板时使用合成模板。结果不一致时以非零状态码退出。
+"""
+import os
+import sys
+import time
+import tempfile
+
+from benchmarks.bench_table_backend import _rounded, diff_pages
+from benchmarks.synthetic import make_template, make_nested_template
+from models import details_abstract
+from models.demo import stopwords_path, must_words_path
+from utils.pdf_utils import open_pdf
+
+
+def extract(path, abstract_fn):
+    """
+    用指定的抽取函数处理模板每一页（pdfplumber 页面）。
+    :return: ([(fixed_area, unfixed_area, 表格范围), ...], 耗时秒数)
+    """
+    pages = []
+    seconds = 0.0
+    with open_pdf(path) as template, template.open_plumber() as plumber:
+        for page in plumber.pages:
+            start = time.perf_counter()
+            _, fixed_area, unfixed_area, extension = abstract_fn(
+                page, stopwords_path=stopwords_path, must_words_path=must_words_path
+            )
+            seconds += time.perf_counter() - start
+            pages.append((
+                {text: _rounded(rect) for text, rect in fixed_area.items()},
+                [_rounded(cell) for cell in unfixed_area],
+                _rounded(extension),
+            ))
+            # 两种实现都会在页面上缓存字符与表格，逐页释放
+            page.close()
+    return pages, seconds
+
+
+def main():
+    paths = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as tmp:
+        if not paths:
+            paths = [os.path.join(tmp, name) for name in ("simple.pdf", "nested.pdf", "large.pdf")]
+            make_template(paths[0], pages=4, rows=10, cols=3)
+            make_nested_template(paths[1], pages=4, rows=4, cols=3, sections=2, entries=3)
+            make_template(paths[2], pages=20, rows=20, cols=4)
+
+        failed = False
+        print(f"{'template':<20} {'pages':>5} {'legacy':>9} {'current':>9} {'speedup':>8}  parity")
+        for path in paths:
+            expected, legacy_seconds = extract(path, details_abstract.abstract_legacy)
+            actual, current_seconds = extract(path, details_abstract.abstract)
+            problems = diff_pages(expected, actual)
+            failed = failed or bool(problems)
+            print(f"{os.path.basename(path):<20} {len(expected):>5} {legacy_seconds:>8.3f}s {current_seconds:>8.3f}s "
+                  f"{legacy_seconds / current_seconds:>7.1f}x  {'ok' if not problems else 'DIFF'}")
+            for problem in problems:
+                print(f"    {problem}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+批量处理（/batch）并发扩展性测试：一个模板对应多份栅格扫描件，按不同的并发数处理，
+比较只用线程（各扫描件在线程内渲染、矫正）与线程 + 共享进程池（与 /batch 相同）的吞吐量。
+OCR 使用确定性替身（见 stub_ocr），实例数量与并发数相同。
+用法（在项目根目录下）：python -m benchmarks.bench_batch_workers [扫描件份数] [并发数列表]
+"""
+import os
+import sys
+import time
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import stub_ocr
+from benchmarks.synthetic import make_nested_template, make_raster_scan, fill_values
+from models import scanned_pages
+from models.demo import compile_template, process
+
+
+def run_batch(template_path, compiled, scan_paths, workers, pooled):
+    """
+    以 workers 个线程处理全部扫描件，pooled 时各扫描件的页面送入 workers 个进程的共享进程池。
+    :return: 耗时（秒）
+    """
+    stub_ocr.install(workers=workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda scan_path: process(template_path, scan_path, compiled=compiled,
+                                      workers=workers if pooled else 0),
+            scan_paths,
+        ))
+    elapsed = time.perf_counter() - start
+    if any(result is None for result in results):
+        raise RuntimeError("处理流程未返回结果")
+    return elapsed
+
+
+def main():
+    scans = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    worker_counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4, 8]
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, "template.pdf")
+        make_nested_template(template_path, pages=2, rows=4, cols=3, sections=2, entries=3)
+        compiled = compile_template(template_path)
+        scan_paths = []
+        for index in range(scans):
+            scan_path = os.path.join(tmp, f"scan_{index}.pdf")
+            make_raster_scan(template_path, scan_path, rotation=0.6, noise=8, seed=index,
+                             values=fill_values(template_path))
+            scan_paths.append(scan_path)
+
+        print(f"{'workers':>8} {'mode':>8} {'seconds':>10} {'scans/s':>10} {'speedup':>8}")
+        baseline = None
+        try:
+            for workers in worker_counts:
+                for pooled in (False, True):
+                    if pooled and workers > 1:
+                        # 预热进程池，避免把进程启动时间计入结果
+                        run_batch(template_path, compiled, scan_paths[:workers], workers, pooled)
+                    elapsed = run_batch(template_path, compiled, scan_paths, workers, pooled)
+                    baseline = baseline or elapsed
+                    mode = "process" if pooled else "thread"
+                    print(f"{workers:>8} {mode:>8} {elapsed:>10.3f} {scans / elapsed:>10.2f} {baseline / elapsed:>8.2f}")
+        finally:
+            scanned_pages.shutdown_scan_pool()
+
+
+if __name__ == "__main__":
+    main()
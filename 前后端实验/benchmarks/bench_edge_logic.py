@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+edge_logic_find 性能测试：在多级表头的合成表格上比较逐级扫描字典与父节点索引两种查找方式。
+用法（在项目根目录下）：python -m benchmarks.bench_edge_logic [表头块数] [表头层数]
+"""
+import sys
+import time
+
+from models import logic_search
+from models.flexible_area_abstract import edge_logic_find
+
+
+def make_nested_headers(blocks, depth):
+    """
+    生成多级表头的固定区域：每个块第 k 列的单元格高度为 2^(depth-k-1) 行，
+    同一行内从左到右单元格逐级变矮，形成 depth 层的逻辑链。
+    :return: {单元格文本: (x0, y0, x1, y1)}
+    """
+    fixed_area = {}
+    rows_per_block = 2 ** (depth - 1)
+    for block in range(blocks):
+        top = block * rows_per_block
+        for col in range(depth):
+            span = 2 ** (depth - col - 1)
+            for row in range(0, rows_per_block, span):
+                y0 = (top + row) * 20
+                fixed_area[f"b{block}_c{col}_r{row}"] = (col * 60, y0, col * 60 + 60, y0 + span * 20)
+    return fixed_area
+
+
+def legacy_edge_logic_find(logic):
+    """
+    逐级扫描整个逻辑链字典查找父节点的原实现，作为对照。
+    """
+    def find_father(element):
+        father_list = []
+        visited = set()
+
+        def dfs(node):
+            for key, values in logic.items():
+                if node in values and key not in visited:
+                    father_list.append(key)
+                    visited.add(key)
+                    dfs(key)
+
+        dfs(element)
+        return father_list
+
+    return {element: [element] + find_father(element) for element in logic if not logic[element]}
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    fixed_area = make_nested_headers(blocks, depth)
+    logic = logic_search.search(fixed_area)
+    print(f"cells: {len(fixed_area)}, edges: {sum(1 for values in logic.values() if not values)}")
+
+    timings = {}
+    results = {}
+    for name, func in (("legacy", legacy_edge_logic_find), ("indexed", edge_logic_find)):
+        start = time.perf_counter()
+        results[name] = func(logic)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:>8} {timings[name]:>10.4f}s")
+
+    assert results["legacy"] == results["indexed"], "两种实现的结果不一致"
+    print(f"speedup: {timings['legacy'] / timings['indexed']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
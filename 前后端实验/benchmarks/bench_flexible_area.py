@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+flexible_abstract 最近固定区域查找性能测试：比较逐个单元格查找与 NumPy 批量查找。
+用法（在项目根目录下）：python -m benchmarks.bench_flexible_area [行数] [列数]
+"""
+import sys
+import time
+
+from models import logic_search
+from models.flexible_area_abstract import find_nearest_fixed_areas, find_nearest_fixed_areas_bulk
+
+
+def make_grid(rows, cols):
+    """
+    生成“标签 | 填写栏”交替排列的表格：偶数列为固定区域，奇数列为非固定区域。
+    :return: (固定区域字典, 非固定区域列表)
+    """
+    fixed_area = {}
+    unfixed_area = []
+    for row in range(rows):
+        for col in range(cols):
+            rect = (col * 40, row * 20, col * 40 + 40, row * 20 + 20)
+            if col % 2 == 0:
+                fixed_area[f"r{row}c{col}"] = rect
+            else:
+                unfixed_area.append(rect)
+    return fixed_area, unfixed_area
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    fixed_area, unfixed_area = make_grid(rows, cols)
+    logic_search.search(fixed_area)
+    print(f"fixed: {len(fixed_area)}, unfixed: {len(unfixed_area)}")
+
+    start = time.perf_counter()
+    legacy = [find_nearest_fixed_areas(unfixed, fixed_area, unfixed_area) for unfixed in unfixed_area]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk = find_nearest_fixed_areas_bulk(fixed_area, unfixed_area)
+    bulk_seconds = time.perf_counter() - start
+
+    assert legacy == bulk, "两种实现的结果不一致"
+    print(f"{'per-cell':>8} {legacy_seconds:>10.4f}s")
+    print(f"{'bulk':>8} {bulk_seconds:>10.4f}s")
+    print(f"speedup: {legacy_seconds / bulk_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+logic_search 分行与层级查找性能测试：比较按 y0 精确分行 + 逐行嵌套扫描的原实现
+与顺序分行 + 单调栈实现（默认容差 0 以及容差 1），并统计坐标抖动下的分行数量。
+耗时取多次运行的中位数；两种实现都是 O(n log n + 关系总数)，差别只在常数。
+用法（在项目根目录下）：python -m benchmarks.bench_logic_search [表头块数] [表头层数] [抖动幅度] [重复次数]
+"""
+import sys
+import time
+import random
+import statistics
+
+from benchmarks.bench_edge_logic import make_nested_headers
+from models import logic_search
+
+
+def legacy_search(fixed_area):
+    """
+    按 y0 完全相等分行、逐行嵌套扫描的原实现，作为对照。
+    """
+    lines = {}
+    for key, rect in sorted(fixed_area.items(), key=lambda item: (item[1][1], item[1][0])):
+        lines.setdefault(rect[1], []).append((key, rect))
+
+    hierarchy = {}
+    for area in lines.values():
+        rects = sorted(area, key=lambda item: item[1][0])
+        for i, (key_i, rect_i) in enumerate(rects):
+            higher_right_rects = []
+            for j in range(i + 1, len(rects)):
+                key_j, rect_j = rects[j]
+                if rect_j[3] < rect_i[3]:
+                    higher_right_rects.append(key_j)
+                else:
+                    break
+            hierarchy[key_i] = higher_right_rects
+    return hierarchy, len(lines)
+
+
+def add_jitter(fixed_area, amount, seed=0):
+    rng = random.Random(seed)
+    return {
+        key: tuple(value + rng.uniform(-amount, amount) for value in rect)
+        for key, rect in fixed_area.items()
+    }
+
+
+def timed(func, *args, repeat=1):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - start)
+    return result, statistics.median(seconds)
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    jitter = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    repeat = int(sys.argv[4]) if len(sys.argv) > 4 else 15
+
+    exact = make_nested_headers(blocks, depth)
+    jittered = add_jitter(exact, jitter)
+    print(f"cells: {len(exact)}, jitter: ±{jitter}, median of {repeat} runs")
+    print(f"{'input':>9} {'impl':>10} {'rows':>7} {'relations':>10} {'seconds':>9}")
+
+    for name, fixed_area in (("exact", exact), ("jittered", jittered)):
+        (legacy, legacy_rows), legacy_seconds = timed(legacy_search, fixed_area, repeat=repeat)
+        rows = [("legacy", legacy, legacy_rows, legacy_seconds)]
+        for tolerance in (0, 1.0):
+            current, seconds = timed(logic_search.search, fixed_area, tolerance, repeat=repeat)
+            current_rows = len(logic_search.sort_fixed_area_into_lines(fixed_area, tolerance))
+            if tolerance == 0:
+                assert current == legacy, "容差为 0 时两种实现的结果应一致"
+            rows.append((f"sweep/{tolerance:g}", current, current_rows, seconds))
+        for impl, hierarchy, row_count, seconds in rows:
+            relations = sum(len(values) for values in hierarchy.values())
+            print(f"{name:>9} {impl:>10} {row_count:>7} {relations:>10} {seconds:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
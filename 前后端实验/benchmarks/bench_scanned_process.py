@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+scanned_process 并行扩展性测试：在 50 页扫描件上比较不同进程数的耗时。
+用法（在项目根目录下）：python -m benchmarks.bench_scanned_process [页数] [进程数列表]
+"""
+import os
+import sys
+import time
+import tempfile
+import logging
+
+from benchmarks.synthetic import make_template, make_scan
+from models.demo import compile_template, scanned_process
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    worker_counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4, 8]
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, "template.pdf")
+        scan_path = os.path.join(tmp, "scan.pdf")
+        make_template(template_path, pages=pages, rows=10, cols=3)
+        make_scan(template_path, scan_path)
+        compiled = compile_template(template_path)
+        extension, references = compiled["extension"], compiled["references"]
+
+        baseline = None
+        print(f"{'workers':>8} {'seconds':>10} {'pages/s':>10} {'speedup':>8}")
+        for workers in worker_counts:
+            if workers > 1:
+                # 预热进程池，避免把进程启动时间计入结果
+                scanned_process(template_path, scan_path, extension, workers=workers, references=references)
+            start = time.perf_counter()
+            result = scanned_process(template_path, scan_path, extension, workers=workers, references=references)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.3f} {len(result) / elapsed:>10.1f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
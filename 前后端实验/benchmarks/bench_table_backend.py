@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+模板表格抽取后端对照测试：分别用 pdfplumber 与 PyMuPDF 编译模板，
+检查两者的 fixed_area / unfixed_area / 表格范围是否一致，并比较每页耗时。
+用法（在项目根目录下）：python -m benchmarks.bench_table_backend [模板.pdf ...]
+不指定模板时使用合成模板。
+"""
+import os
+import sys
+import time
+import tempfile
+
+from benchmarks.synthetic import make_template, make_nested_template
+from models import details_abstract, table_engine
+from models.demo import stopwords_path, must_words_path
+from utils.pdf_utils import open_pdf
+
+# 坐标比较时保留的小数位数：pdfplumber 的坐标带有十进制换算误差（如 534.0000133）
+COORD_DIGITS = 3
+
+
+def _rounded(rect):
+    return tuple(round(float(value), COORD_DIGITS) for value in rect)
+
+
+def extract(path, backend):
+    """
+    用指定后端抽取模板每一页的表格。
+    :return: ([(fixed_area, unfixed_area, 表格范围), ...], 耗时秒数)
+    """
+    pages = []
+    with open_pdf(path) as template:
+        start = time.perf_counter()
+        with table_engine.open_pages(template, backend) as template_pages:
+            for page in template_pages:
+                _, fixed_area, unfixed_area, extension = details_abstract.abstract(
+                    table_engine.page_tables(page, backend),
+                    stopwords_path=stopwords_path, must_words_path=must_words_path
+                )
+                pages.append((
+                    {text: _rounded(rect) for text, rect in fixed_area.items()},
+                    [_rounded(cell) for cell in unfixed_area],
+                    _rounded(extension),
+                ))
+        seconds = time.perf_counter() - start
+    return pages, seconds
+
+
+def diff_pages(expected, actual):
+    """
+    :return: 两个后端结果不一致之处的描述列表
+    """
+    problems = []
+    if len(expected) != len(actual):
+        return [f"page count {len(expected)} != {len(actual)}"]
+    for page_num, ((fixed_a, unfixed_a, ext_a), (fixed_b, unfixed_b, ext_b)) in enumerate(zip(expected, actual)):
+        if fixed_a != fixed_b:
+            missing = sorted(set(fixed_a) - set(fixed_b))
+            extra = sorted(set(fixed_b) - set(fixed_a))
+            problems.append(f"page {page_num}: fixed_area differs (missing {missing[:5]}, extra {extra[:5]})")
+        elif list(fixed_a) != list(fixed_b):
+            problems.append(f"page {page_num}: fixed_area order differs")
+        if unfixed_a != unfixed_b:
+            problems.append(f"page {page_num}: unfixed_area differs ({len(unfixed_a)} vs {len(unfixed_b)} cells)")
+        if ext_a != ext_b:
+            problems.append(f"page {page_num}: extension {ext_a} != {ext_b}")
+    return problems
+
+
+def main():
+    paths = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as tmp:
+        if not paths:
+            paths = [os.path.join(tmp, name) for name in ("simple.pdf", "nested.pdf", "large.pdf")]
+            make_template(paths[0], pages=4, rows=10, cols=3)
+            make_nested_template(paths[1], pages=4, rows=4, cols=3, sections=2, entries=3)
+            make_template(paths[2], pages=20, rows=20, cols=4)
+
+        failed = False
+        print(f"{'template':<20} {'pages':>5} {'pdfplumber':>11} {'pymupdf':>9} {'speedup':>8}  parity")
+        for path in paths:
+            expected, plumber_seconds = extract(path, "pdfplumber")
+            actual, fitz_seconds = extract(path, "pymupdf")
+            problems = diff_pages(expected, actual)
+            failed = failed or bool(problems)
+            print(f"{os.path.basename(path):<20} {len(expected):>5} {plumber_seconds:>10.3f}s {fitz_seconds:>8.3f}s "
+                  f"{plumber_seconds / fitz_seconds:>7.1f}x  {'ok' if not problems else 'DIFF'}")
+            for problem in problems:
+                print(f"    {problem}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
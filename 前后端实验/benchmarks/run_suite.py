@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+可复现的性能测试套件：生成合成模板与扫描件，对完整处理流程逐阶段计时，
+记录吞吐量与峰值内存，并可与保存的基线比较。默认使用确定性的 OCR 替身，可离线运行。
+用法（在项目根目录下）：
+    python -m benchmarks.run_suite [--scenario 名称 ...] [--repeat N] [--output 结果.json]
+                                   [--baseline 基线.json] [--threshold 0.1] [--real-ocr] [--ocr-cache]
+与基线相比出现性能退化或输出变化时以非零状态码退出。
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import resource
+import statistics
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import stub_ocr
+from benchmarks.synthetic import (make_template, make_nested_template, make_scan, make_raster_scan, make_bulk_scan,
+                                  fill_values)
+from models import ocr_engine, scanned_pages
+from models.ocr_cache import OCRCache
+from models.demo import compile_template, process, process_instances
+from utils import metrics
+from utils.pdf_utils import open_pdf
+
+# 耗时差值小于该值（秒）时不视为退化，避免极短的场景因计时抖动误报
+MIN_REGRESSION_SECONDS = 0.01
+
+# 测试场景：模板生成参数与扫描件生成参数
+SCENARIOS = {
+    "simple": {
+        "template": {"kind": "simple", "pages": 4, "rows": 10, "cols": 3},
+        "scan": {},
+    },
+    "nested": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"center": (297.5, 260)},
+    },
+    "rotated": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"raster": True, "rotation": 0.6},
+    },
+    "skewed_noisy": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"raster": True, "rotation": -0.4, "skew": 0.01, "noise": 12},
+    },
+    # 旋转较大时表格外框的角落超出渲染区域的边距，外框被截断，只能靠特征匹配对齐
+    "tilted": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"raster": True, "rotation": 3.0, "noise": 8},
+    },
+    # 每两个空白单元格填写一个，其余保持空白
+    "filled": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"raster": True, "rotation": 0.6, "noise": 12, "fill_every": 2},
+    },
+    # 数字化填写：扫描件保留文本层，直接读取文字，不渲染、不 OCR
+    "digital": {
+        "template": {"kind": "nested", "pages": 4, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"center": (297.5, 260), "fill_every": 2},
+    },
+    # 整批扫描：同一份扫描件重复 10 次，按页面相似度切分为实例后处理
+    "bulk": {
+        "template": {"kind": "nested", "pages": 2, "rows": 4, "cols": 3, "sections": 2, "entries": 3},
+        "scan": {"raster": True, "rotation": 0.6, "noise": 8, "fill_every": 2, "copies": 10},
+        "instances": "detect",
+    },
+    "large": {
+        "template": {"kind": "simple", "pages": 20, "rows": 20, "cols": 4},
+        "scan": {},
+    },
+}
+
+
+def build_inputs(spec, directory):
+    """
+    按场景参数生成模板与扫描件。
+    :return: (模板路径, 扫描件路径)
+    """
+    template_path = os.path.join(directory, "template.pdf")
+    scan_path = os.path.join(directory, "scan.pdf")
+
+    template = dict(spec["template"])
+    if template.pop("kind") == "nested":
+        make_nested_template(template_path, **template)
+    else:
+        make_template(template_path, **template)
+
+    scan = dict(spec["scan"])
+    fill_every = scan.pop("fill_every", None)
+    copies = scan.pop("copies", None)
+    if fill_every:
+        scan["values"] = fill_values(template_path, fill_every)
+    if scan.pop("raster", False):
+        make_raster_scan(template_path, scan_path, **scan)
+    else:
+        make_scan(template_path, scan_path, **scan)
+    if copies:
+        bulk_path = os.path.join(directory, "bulk.pdf")
+        make_bulk_scan(scan_path, bulk_path, copies)
+        scan_path = bulk_path
+    return template_path, scan_path
+
+
+def run_scenario(name, spec, repeat, real_ocr, ocr_cache=False):
+    """
+    在独立的进程中运行一个场景，峰值内存只反映该场景。
+    :param ocr_cache: 是否启用 OCR 结果缓存（重复运行即模拟重复提交的扫描件）
+    :return: 场景结果字典
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    if not real_ocr:
+        stub_ocr.install(cache=OCRCache() if ocr_cache else None)
+    elif ocr_cache:
+        ocr_engine.get_engine().cache = OCRCache()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path, scan_path = build_inputs(spec, tmp)
+
+        start = time.perf_counter()
+        with metrics.collect() as compile_timings:
+            compiled = compile_template(template_path)
+        compile_seconds = time.perf_counter() - start
+
+        runs = []
+        result = None
+        instances = spec.get("instances")
+        for _ in range(repeat):
+            with metrics.track_request() as timings:
+                if instances:
+                    result = process_instances(template_path, scan_path, compiled=compiled,
+                                               detect=instances == "detect")
+                else:
+                    result = process(template_path, scan_path, compiled=compiled)
+            runs.append(timings.to_dict())
+        with open_pdf(scan_path) as scanned:
+            scan_pages = scanned.page_count
+    # 场景在独立的子进程中运行，退出前关闭扫描页进程池
+    scanned_pages.shutdown_scan_pool()
+
+    walls = [run["wall"] for run in runs]
+    stages = {stage: [entry["wall"]] for stage, entry in compile_timings.to_dict()["stages"].items()}
+    for run in runs:
+        for stage, entry in run["stages"].items():
+            stages.setdefault(stage, []).append(entry["wall"])
+
+    pages = scan_pages if instances else compiled["page_count"]
+    wall = statistics.median(walls)
+    return {
+        "scenario": name,
+        "pages": pages,
+        "cells": runs[-1]["counters"].get("cells", 0),
+        "ocr_calls": runs[-1]["counters"].get("ocr_calls", 0),
+        "ocr_cache_hits": runs[-1]["counters"].get("ocr_cache_hits", 0),
+        "feature_alignments": runs[-1]["counters"].get("feature_alignments", 0),
+        "blank_cells": runs[-1]["counters"].get("blank_cells", 0),
+        "text_layer_pages": runs[-1]["counters"].get("text_layer_pages", 0),
+        "compile_seconds": round(compile_seconds, 6),
+        "wall_seconds": round(wall, 6),
+        "pages_per_second": round(pages / wall, 3) if wall else None,
+        "stages": {stage: round(statistics.median(values), 6) for stage, values in sorted(stages.items())},
+        # Linux 下 ru_maxrss 的单位为 KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "output_entries": len(result or {}),
+        "output_hash": hashlib.md5(
+            json.dumps(result, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较：耗时超过基线 (1 + threshold) 倍视为退化，输出哈希不同视为结果变化。
+    :return: 问题描述列表
+    """
+    problems = []
+    baseline = {entry["scenario"]: entry for entry in baseline}
+    print(f"\n{'scenario':<14} {'metric':<22} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for entry in results:
+        base = baseline.get(entry["scenario"])
+        if base is None:
+            continue
+        metrics_to_compare = [("wall_seconds", base["wall_seconds"], entry["wall_seconds"]),
+                              ("compile_seconds", base["compile_seconds"], entry["compile_seconds"]),
+                              ("peak_rss_mb", base["peak_rss_mb"], entry["peak_rss_mb"])]
+        metrics_to_compare += [(f"stage:{stage}", base["stages"][stage], value)
+                               for stage, value in entry["stages"].items() if stage in base["stages"]]
+        for metric, old, new in metrics_to_compare:
+            ratio = new / old if old else 1.0
+            flag = ""
+            noticeable = metric == "peak_rss_mb" or new - old > MIN_REGRESSION_SECONDS
+            if ratio > 1 + threshold and noticeable and not metric.startswith("stage:"):
+                flag = "  REGRESSION"
+                problems.append(f"{entry['scenario']}: {metric} {old} -> {new}")
+            print(f"{entry['scenario']:<14} {metric:<22} {old:>10.4f} {new:>10.4f} {ratio:>7.2f}{flag}")
+        if base["output_hash"] != entry["output_hash"]:
+            problems.append(f"{entry['scenario']}: output changed")
+            print(f"{entry['scenario']:<14} output changed")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic benchmark suite for the processing pipeline")
+    parser.add_argument("--scenario", nargs="*", choices=sorted(SCENARIOS), help="scenarios to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="process() runs per scenario, median is reported")
+    parser.add_argument("--output", help="write results to this JSON file (e.g. to save a baseline)")
+    parser.add_argument("--baseline", help="compare against a previously saved results file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown ratio before failing")
+    parser.add_argument("--real-ocr", action="store_true", help="use PaddleOCR instead of the deterministic stub")
+    parser.add_argument("--ocr-cache", action="store_true", help="enable the OCR result cache across repeats")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'scenario':<14} {'pages':>5} {'cells':>6} {'blank':>6} {'text':>5} {'compile':>9} {'process':>9} "
+          f"{'pages/s':>8} {'rss MB':>8}")
+    for name in args.scenario or SCENARIOS:
+        # 每个场景使用新的进程，峰值内存互不影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            entry = pool.submit(run_scenario, name, SCENARIOS[name], args.repeat, args.real_ocr,
+                                args.ocr_cache).result()
+        results.append(entry)
+        print(f"{name:<14} {entry['pages']:>5} {entry['cells']:>6} {entry['blank_cells']:>6} {entry['text_layer_pages']:>5} "
+              f"{entry['compile_seconds']:>9.3f} {entry['wall_seconds']:>9.3f} {entry['pages_per_second']:>8.1f} "
+              f"{entry['peak_rss_mb']:>8.1f}")
+        print("    " + ", ".join(f"{stage}={value:.4f}" for stage, value in entry["stages"].items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.threshold)
+        if problems:
+            print("\n" + "\n".join(problems))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
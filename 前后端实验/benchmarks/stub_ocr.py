@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+确定性的 OCR 替身：接口与 PaddleOCR.ocr 相同，按图像内容的哈希生成文本，
+不需要下载模型，同样的输入总是得到同样的输出，便于离线运行性能测试并比较结果。
+"""
+import hashlib
+
+import numpy as np
+
+from models import ocr_engine
+
+
+class StubOCR:
+
+    @staticmethod
+    def _text(image):
+        return hashlib.md5(np.ascontiguousarray(image).tobytes()).hexdigest()[:12]
+
+    def ocr(self, img, det=True, rec=True, cls=False):
+        if not det:
+            images = img if isinstance(img, list) else [img]
+            return [[(self._text(image), 1.0) for image in images]]
+        return [[[None, (self._text(img), 1.0)]]]
+
+
+def install(workers=1, cache=None):
+    """
+    将进程内共享的 OCR 引擎替换为 StubOCR。
+    :param cache: OCR 结果缓存（OCRCache），为 None 时不缓存
+    """
+    ocr_engine.set_engine(ocr_engine.OCREngine(workers=workers, factory=StubOCR, cache=cache))
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+合成表单生成器：生成带表格的模板 PDF 及对应的“扫描件”，供性能测试使用。
+扫描件可以是矢量缩放的版本，也可以是带旋转、倾斜与噪声的栅格化版本。
+"""
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+FONT = "china-s"
+
+LABELS = ["姓名", "性别", "民族", "籍贯", "出生年月", "居民身份证号", "家庭地址", "联系电话"]
+
+# 多级表头分区：(分区标题, 列标题)
+SECTIONS = [
+    ("个人简历", ["何年何月", "何单位或部门任何职务", "证明人"]),
+    ("培养联系人", ["姓名", "所在党支部及职务", "入党时间"]),
+    ("家庭成员", ["称谓", "姓名", "工作单位", "政治面貌"]),
+]
+
+
+def draw_cell(page, rect, text=None, fontsize=10):
+    page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+    if text:
+        page.insert_text((rect.x0 + 4, rect.y0 + min(rect.height - 6, 18)), text, fontname=FONT, fontsize=fontsize)
+
+
+def make_template(path, pages=1, rows=4, cols=3):
+    """
+    生成模板 PDF：每页一个“标签 | 填写栏”交替排列的表格。
+    :param path: 输出路径
+    :param pages: 页数
+    :param rows: 每页行数
+    :param cols: 每行“标签 + 填写栏”对数
+    """
+    doc = fitz.open()
+    x0, y0 = 50, 80
+    cell_width = (PAGE_WIDTH - 2 * x0) / (2 * cols)
+    cell_height = min(30, (PAGE_HEIGHT - 2 * y0) / rows)
+    for _ in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for row in range(rows):
+            for col in range(2 * cols):
+                rect = fitz.Rect(
+                    x0 + col * cell_width, y0 + row * cell_height,
+                    x0 + (col + 1) * cell_width, y0 + (row + 1) * cell_height,
+                )
+                label = None
+                if col % 2 == 0:
+                    label = f"{LABELS[(row * cols + col // 2) % len(LABELS)]}{row * cols + col // 2}"
+                draw_cell(page, rect, label)
+        # 表格外框加粗，便于扫描件的边界检测
+        page.draw_rect(fitz.Rect(x0, y0, x0 + 2 * cols * cell_width, y0 + rows * cell_height),
+                       color=(0, 0, 0), width=2)
+    doc.save(path)
+    doc.close()
+
+
+def make_nested_template(path, pages=1, rows=4, cols=3, sections=2, entries=3):
+    """
+    生成带多级表头的模板 PDF：上部为“标签 | 填写栏”行，下部为若干分区，
+    每个分区左侧的分区标题纵跨整个分区，右侧第一行为列标题，其下为 entries 行填写栏
+    （与 output.json 中“个人简历”“培养联系人”一类的表格结构相同）。
+    :param path: 输出路径
+    :param pages: 页数
+    :param rows: 每页“标签 | 填写栏”的行数
+    :param cols: 每行“标签 + 填写栏”对数
+    :param sections: 每页分区数
+    :param entries: 每个分区的填写行数
+    """
+    doc = fitz.open()
+    x0, y0 = 50, 80
+    table_width = PAGE_WIDTH - 2 * x0
+    cell_width = table_width / (2 * cols)
+    total_rows = rows + sections * (entries + 1)
+    cell_height = min(30, (PAGE_HEIGHT - 2 * y0) / total_rows)
+    section_width = cell_width
+
+    for _ in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for row in range(rows):
+            for col in range(2 * cols):
+                rect = fitz.Rect(
+                    x0 + col * cell_width, y0 + row * cell_height,
+                    x0 + (col + 1) * cell_width, y0 + (row + 1) * cell_height,
+                )
+                label = None
+                if col % 2 == 0:
+                    label = f"{LABELS[(row * cols + col // 2) % len(LABELS)]}{row * cols + col // 2}"
+                draw_cell(page, rect, label)
+
+        top = y0 + rows * cell_height
+        for section in range(sections):
+            title, headers = SECTIONS[section % len(SECTIONS)]
+            bottom = top + (entries + 1) * cell_height
+            draw_cell(page, fitz.Rect(x0, top, x0 + section_width, bottom), f"{title}{section}")
+            header_width = (table_width - section_width) / len(headers)
+            for col, header in enumerate(headers):
+                left = x0 + section_width + col * header_width
+                draw_cell(page, fitz.Rect(left, top, left + header_width, top + cell_height), f"{header}{section}")
+                for entry in range(entries):
+                    row_top = top + (entry + 1) * cell_height
+                    draw_cell(page, fitz.Rect(left, row_top, left + header_width, row_top + cell_height))
+            top = bottom
+
+        # 表格外框加粗，便于扫描件的边界检测
+        page.draw_rect(fitz.Rect(x0, y0, x0 + table_width, top), color=(0, 0, 0), width=2)
+    doc.save(path)
+    doc.close()
+
+
+def fill_values(template_path, every=2, texts=("张三", "2024.1.1", "山东", "13800000000")):
+    """
+    为模板第一页的空白单元格生成填写内容：每 every 个空白单元格填写一个，供 make_scan 的 values 参数使用。
+    :param template_path: 模板 PDF 路径
+    :param every: 填写间隔，1 表示全部填写
+    :param texts: 轮流使用的填写文本
+    :return: [(x, y, 文本), ...]，模板坐标
+    """
+    doc = fitz.open(template_path)
+    page = doc.load_page(0)
+    words = [fitz.Rect(word[:4]) for word in page.get_text("words")]
+    cells = [
+        drawing["rect"] for drawing in page.get_drawings()
+        if drawing["rect"].width >= 1 and drawing["rect"].height >= 1
+        and not any(drawing["rect"].intersects(word) for word in words)
+    ]
+    doc.close()
+    cells.sort(key=lambda rect: (rect.y0, rect.x0))
+    return [
+        (rect.x0 + 4, rect.y0 + min(rect.height - 6, 18), texts[idx % len(texts)])
+        for idx, rect in enumerate(cells[::every])
+    ]
+
+
+def _scaled_copy(template_path, scale, center, values):
+    """
+    整页按 scale 绕 center 缩放，并写入填写内容，返回新的 fitz.Document。
+    """
+    src = fitz.open(template_path)
+    out = fitz.open()
+    cx, cy = center
+    for page_num, src_page in enumerate(src):
+        page = out.new_page(width=src_page.rect.width, height=src_page.rect.height)
+        r = src_page.rect
+        target = fitz.Rect(cx + (r.x0 - cx) * scale, cy + (r.y0 - cy) * scale,
+                           cx + (r.x1 - cx) * scale, cy + (r.y1 - cy) * scale)
+        # 先写入填写内容再放置模板：先放置模板时，页面上同名的字体资源会指向模板内的字体，
+        # 写入的文字在文本层中无法正确还原
+        for x, y, text in values or []:
+            page.insert_text((cx + (x - cx) * scale, cy + (y - cy) * scale), text, fontname=FONT, fontsize=10)
+        page.show_pdf_page(target, src, page_num)
+    src.close()
+    return out
+
+
+def make_scan(template_path, path, scale=0.97, center=(PAGE_WIDTH / 2, 150), values=None):
+    """
+    由模板生成“扫描件”：整页按 scale 绕 center 缩放，并在指定位置写入填写内容。
+    :param template_path: 模板 PDF 路径
+    :param path: 输出路径
+    :param scale: 缩放比例，使表格边框落在模板表格范围之内
+    :param center: 缩放中心
+    :param values: [(x, y, 文本), ...]，以模板坐标给出的填写内容
+    """
+    out = _scaled_copy(template_path, scale, center, values)
+    out.save(path)
+    out.close()
+
+
+def make_raster_scan(template_path, path, scale=0.97, center=(PAGE_WIDTH / 2, 150), values=None,
+                     rotation=0.0, skew=0.0, noise=0.0, dpi=150, seed=0):
+    """
+    生成栅格化的“扫描件”：在 make_scan 的基础上把每页渲染为图像，
+    再做旋转、水平倾斜并叠加高斯噪声，最后以图片形式写回 PDF。
+    :param rotation: 绕页面中心旋转的角度（度）
+    :param skew: 水平错切系数（x 方向偏移 = skew * y）
+    :param noise: 高斯噪声的标准差（灰度级）
+    :param dpi: 栅格化分辨率
+    :param seed: 噪声随机种子，保证结果可复现
+    """
+    vector = _scaled_copy(template_path, scale, center, values)
+    out = fitz.open()
+    rng = np.random.default_rng(seed)
+    for page in vector:
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+        height, width = image.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+        matrix[0, 1] += skew
+        matrix[0, 2] -= skew * height / 2
+        image = cv2.warpAffine(image, matrix, (width, height), borderValue=255)
+
+        if noise:
+            image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+
+        target = out.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, stream=cv2.imencode(".png", image)[1].tobytes())
+    out.save(path)
+    out.close()
+    vector.close()
+
+
+def make_bulk_scan(scan_path, path, copies=2):
+    """
+    生成整批扫描的多实例扫描件：把同一份扫描件重复 copies 次，合并为一个 PDF。
+    :param scan_path: 单份扫描件路径
+    :param path: 输出路径
+    :param copies: 实例份数
+    """
+    src = fitz.open(scan_path)
+    out = fitz.open()
+    for _ in range(copies):
+        out.insert_pdf(src)
+    out.save(path)
+    out.close()
+    src.close()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+基于 ORB 特征的页面对齐：在缩小后的图像金字塔上检测特征点，与模板页缓存的特征匹配并估计单应矩阵。
+扫描页的表格外框不是干净的四边形（缺角、被遮挡、印章压线等）时，用它代替轮廓检测。
+本模块只依赖 OpenCV，可在进程池的工作进程中导入。
+"""
+import os
+
+import cv2
+import numpy as np
+
+# 边界检测失败时是否改用特征匹配对齐
+ALIGN_FEATURES = os.environ.get("ALIGN_FEATURES", "1") == "1"
+
+# 每页最多检测的特征点数量
+ORB_FEATURES = 1500
+
+# 特征检测在长边不超过该值（像素）的金字塔层上进行，检测结果再换算回原图坐标
+ALIGN_MAX_SIDE = 1000
+
+# 比值检验的阈值：最近邻距离须小于次近邻距离的该倍数
+RATIO_TEST = 0.75
+
+# 估计单应矩阵所需的最少内点数
+MIN_INLIERS = 12
+
+# RANSAC 重投影误差阈值（原图像素）
+RANSAC_THRESHOLD = 4.0
+
+# 单应矩阵线性部分的缩放须在该范围内，否则视为错误匹配
+SCALE_RANGE = (0.5, 2.0)
+
+
+def pyramid_down(gray, max_side=ALIGN_MAX_SIDE):
+    """
+    逐级 pyrDown，直到图像长边不超过 max_side。
+    :return: (缩小后的图像, 缩放比例 = 缩小后尺寸 / 原尺寸)
+    """
+    scale = 1.0
+    while max(gray.shape[:2]) > max_side:
+        gray = cv2.pyrDown(gray)
+        scale /= 2
+    return gray, scale
+
+
+def compute_features(gray, max_side=ALIGN_MAX_SIDE):
+    """
+    在图像金字塔上检测 ORB 特征点。
+    :param gray: 灰度图像
+    :return: {"points": 原图坐标 (N, 2) float32, "descriptors": (N, 32) uint8}，没有特征点时返回 None
+    """
+    small, scale = pyramid_down(gray, max_side)
+    keypoints, descriptors = cv2.ORB_create(nfeatures=ORB_FEATURES).detectAndCompute(small, None)
+    if descriptors is None or len(keypoints) < MIN_INLIERS:
+        return None
+    points = np.float32([keypoint.pt for keypoint in keypoints]) / np.float32(scale)
+    return {"points": points, "descriptors": descriptors}
+
+
+def estimate_homography(features, ref_features):
+    """
+    匹配两组特征并用 RANSAC 估计单应矩阵。
+    :param features: 待对齐图像的特征（见 compute_features）
+    :param ref_features: 参考图像的特征
+    :return: 3x3 单应矩阵（待对齐图像坐标 -> 参考图像坐标），匹配不足或结果不合理时返回 None
+    """
+    if features is None or ref_features is None:
+        return None
+    pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(features["descriptors"], ref_features["descriptors"], k=2)
+    good = [pair[0] for pair in pairs if len(pair) == 2 and pair[0].distance < RATIO_TEST * pair[1].distance]
+    if len(good) < MIN_INLIERS:
+        return None
+
+    src = features["points"][[match.queryIdx for match in good]]
+    dst = ref_features["points"][[match.trainIdx for match in good]]
+    matrix, mask = cv2.findHomography(src, dst, cv2.RANSAC, RANSAC_THRESHOLD)
+    if matrix is None or int(mask.sum()) < MIN_INLIERS:
+        return None
+
+    # 排除退化或翻转的变换：线性部分的行列式即面积缩放比例
+    det = np.linalg.det(matrix[:2, :2])
+    low, high = SCALE_RANGE
+    if not low * low <= det <= high * high:
+        return None
+    return matrix
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+空白单元格检测：对矫正后的整页图像二值化一次并计算积分图，
+之后每个单元格的墨迹像素数都可以 O(1) 求出，墨迹过少的单元格直接判为空白，不送 OCR。
+"""
+import os
+
+import cv2
+import numpy as np
+
+# 是否在 OCR 之前跳过空白单元格
+BLANK_DETECTION = os.environ.get("BLANK_DETECTION", "1") == "1"
+
+# 灰度低于该值的像素视为墨迹；低分辨率渲染时笔画多为抗锯齿的灰色像素，阈值不宜过低
+BLANK_INK_THRESHOLD = int(os.environ.get("BLANK_INK_THRESHOLD", 180))
+
+# 单元格内墨迹像素占比低于该值时视为空白
+BLANK_INK_RATIO = float(os.environ.get("BLANK_INK_RATIO", 0.003))
+
+# 统计墨迹时单元格四边向内收缩的距离（PDF 坐标单位），避开表格线与矫正误差
+BLANK_INSET = float(os.environ.get("BLANK_INSET", 3))
+
+
+class InkMap:
+    """
+    整页墨迹分布：二值化后的积分图。
+    """
+
+    def __init__(self, image, threshold=BLANK_INK_THRESHOLD):
+        """
+        :param image: BGR 图像或灰度图像
+        :param threshold: 墨迹的灰度阈值
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        ink = (gray < threshold).view(np.uint8)
+        # integral[y, x] 为 ink[:y, :x] 之和，比图像多一行一列
+        self.integral = cv2.integral(ink)
+        self.height, self.width = gray.shape[:2]
+
+    def ink_pixels(self, box):
+        """
+        :param box: 整数像素坐标 (x0, y0, x1, y1)，越界部分截断到图像范围内
+        :return: (区域内的墨迹像素数, 区域面积)
+        """
+        x0, y0, x1, y1 = box
+        x0, x1 = max(0, min(x0, self.width)), max(0, min(x1, self.width))
+        y0, y1 = max(0, min(y0, self.height)), max(0, min(y1, self.height))
+        if x1 <= x0 or y1 <= y0:
+            return 0, 0
+        integral = self.integral
+        pixels = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        return int(pixels), (x1 - x0) * (y1 - y0)
+
+    def is_blank(self, box, ratio=BLANK_INK_RATIO):
+        """
+        :param box: 整数像素坐标 (x0, y0, x1, y1)
+        :param ratio: 墨迹占比阈值
+        :return: 区域是否为空白；区域为空（收缩后没有剩余面积或完全越界）时返回 False，交给 OCR 判断
+        """
+        pixels, area = self.ink_pixels(box)
+        return area > 0 and pixels < ratio * area
@@ -1,24 +1,23 @@
 # -*- coding: utf-8 -*-
-import fitz  # PyMuPDF
-from PIL import Image
-from paddleocr import PaddleOCR
-import pdfplumber
+from models import blank_cells
 from models import details_abstract
 from models import logic_search
 from models import flexible_area_abstract
+from models import instances
+from models import ocr_engine
+from models import scanned_pages
+from models import table_engine
+from models import text_layer
+from models.word_matcher import get_matcher
+from utils import metrics
+from utils.pdf_utils import open_pdf
 import os
-import io
-import cv2
-import numpy as np
-import shutil
+import hashlib
 import logging
 
 # 配置日志记录
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-ocr = PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=False)  # 启用 GPU 加速时设置 use_gpu=True
-
-
 # 获取当前文件所在目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -62,230 +61,433 @@ def build_logic_tree(input_dict):
     return logic_tree
 
 
-def mode_process(pdf_path):
+def compile_fingerprint(dpi=None, table_backend=None):
     """
-    模板处理函数
+    模板编译结果除模板内容之外还依赖的输入：停用词与必须词词表（可热更新）、分行容差、
+    参考边界的渲染分辨率与表格抽取后端。任何一项变化后，缓存的编译结果都须重新编译。
+    :param dpi: 参考边界的渲染分辨率，默认取 RENDER_DPI
+    :param table_backend: 表格抽取后端，默认取 table_engine.TABLE_BACKEND
+    :return: sha256 十六进制字符串
     """
-    result = {}
+    parts = [
+        f"table_backend={table_backend or table_engine.TABLE_BACKEND}",
+        f"dpi={dpi or scanned_pages.RENDER_DPI}",
+        f"row_tolerance={logic_search.ROW_TOLERANCE}",
+    ]
+    for path in (stopwords_path, must_words_path):
+        matcher = get_matcher(path)
+        matcher.refresh()
+        parts.append("\n".join(matcher.words))
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def compile_template(pdf_path, dpi=None, table_backend=None):
+    """
+    模板编译函数：对每页执行表格抽取、层级逻辑查找与灵活区域推导，并检测各页的参考边界。
+    编译结果由模板内容与 compile_fingerprint 中的输入决定，可按模板哈希缓存，指纹变化时须重新编译。
+    :param pdf_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param dpi: 参考边界的渲染分辨率，默认取 RENDER_DPI
+    :param table_backend: 表格抽取后端（pdfplumber / pymupdf），默认取 table_engine.TABLE_BACKEND
+    :return: 编译结果字典 {"pages", "details", "logic", "extension", "references", "anchors", "signatures",
+             "page_count", "table_backend", "fingerprint"}
+    """
+    # 先计算指纹：编译过程中词表被修改时，结果按旧指纹记录，下次使用时重新编译
+    fingerprint = compile_fingerprint(dpi, table_backend)
+    pages = {}
     details_num = {}
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            doc = fitz.open(pdf_path)
-            for page_num in range(len(doc)):
-                page_plum = pdf.pages[page_num]
-                details, fixed_area, unfixed_area, extension = details_abstract.abstract(
-                    page_plum, stopwords_path=stopwords_path, must_words_path=must_words_path
-                )
+    logic_num = {}
+    extension = None
+    table_backend = table_backend or table_engine.TABLE_BACKEND
+    with open_pdf(pdf_path) as template:
+        # 表格抽取与参考边界渲染共用同一份已解析的文档数据
+        with table_engine.open_pages(template, table_backend) as template_pages:
+            for page_num, page in enumerate(template_pages):
+                with metrics.stage("table_extraction", page=page_num):
+                    details, fixed_area, unfixed_area, extension = details_abstract.abstract(
+                        table_engine.page_tables(page, table_backend),
+                        stopwords_path=stopwords_path, must_words_path=must_words_path
+                    )
                 details_num[page_num] = details
-                logic = logic_search.search(fixed_area)
-                flexible_area = flexible_area_abstract.flexible_abstract(logic, fixed_area, unfixed_area)
-                result[page_num] = flexible_area
-            doc.close()
-    except Exception as e:
-        logging.error(f"模板处理失败：{e}")
-    return result, extension
-
-
-def detect_border(image):
+                with metrics.stage("hierarchy_search", page=page_num):
+                    logic = logic_search.search(fixed_area)
+                logic_num[page_num] = logic
+                with metrics.stage("flexible_area", page=page_num):
+                    pages[page_num] = flexible_area_abstract.flexible_abstract(logic, fixed_area, unfixed_area)
+        references = scanned_pages.compile_references(template, dpi or scanned_pages.RENDER_DPI)
+        anchors = text_layer.compile_anchors(template)
+        signatures = instances.compile_signatures(template)
+
+    return {
+        "pages": pages,
+        "details": details_num,
+        "logic": logic_num,
+        "extension": extension,
+        "references": references,
+        "anchors": anchors,
+        "signatures": signatures,
+        "page_count": len(pages),
+        "table_backend": table_backend,
+        "fingerprint": fingerprint,
+    }
+
+
+def ensure_references(compiled, mode_path, dpi=None):
     """
-    边界检测函数
+    确保编译结果中的参考边界与当前渲染分辨率一致，不一致（或旧版缓存缺失）时重新计算。
+    对齐特征按需提取（见 scanned_pages.ensure_features）；旧版缓存在关闭特征对齐时编译的参考信息
+    记录了空特征，同样重新计算。
+    :return: 参考几何信息（见 scanned_pages.compile_references）
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
-
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    if not contours:
-        raise ValueError("未检测到轮廓，请检查参考图片是否正确。")
+    dpi = dpi or scanned_pages.RENDER_DPI
+    references = compiled.get("references")
+    if references is None or references["dpi"] != dpi or references.get("features") is False:
+        references = scanned_pages.compile_references(mode_path, dpi)
+        compiled["references"] = references
+    return references
 
-    largest_contour = max(contours, key=cv2.contourArea)
-    epsilon = 0.1 * cv2.arcLength(largest_contour, True)
-    approx = cv2.approxPolyDP(largest_contour, epsilon, True)
 
-    if len(approx) != 4:
-        raise ValueError("检测到的轮廓不是四边形，请检查参考图片是否正确。")
-
-    pts_border = np.squeeze(approx).astype(np.float32)
+def ensure_anchors(compiled, mode_path):
+    """
+    确保编译结果中带有文本层对齐用的模板锚点，旧版缓存缺失时重新提取。
+    :return: {页码: 锚点}（见 text_layer.compile_anchors）
+    """
+    anchors = compiled.get("anchors")
+    if anchors is None:
+        anchors = text_layer.compile_anchors(mode_path)
+        compiled["anchors"] = anchors
+    return anchors
 
-    def order_points(pts):
-        rect = np.zeros((4, 2), dtype=np.float32)
-        s = pts.sum(axis=1)
-        rect[0] = pts[np.argmin(s)]  # 左上
-        rect[2] = pts[np.argmax(s)]  # 右下
-        diff = np.diff(pts, axis=1)
-        rect[1] = pts[np.argmin(diff)]  # 右上
-        rect[3] = pts[np.argmax(diff)]  # 左下
-        return rect
 
-    pts_border = order_points(pts_border)
-    canvas_height, canvas_width = image.shape[:2]
-    return pts_border, (canvas_width, canvas_height)
+def ensure_signatures(compiled, mode_path):
+    """
+    确保编译结果中带有识别实例边界用的模板页缩略图特征，旧版缓存缺失时重新计算。
+    :return: 模板各页的缩略图特征（见 instances.compile_signatures）
+    """
+    signatures = compiled.get("signatures")
+    if signatures is None:
+        signatures = instances.compile_signatures(mode_path)
+        compiled["signatures"] = signatures
+    return signatures
 
 
-def scanned_process(mode_path, pdf_path, mode_extension):
+def mode_process(pdf_path):
+    """
+    模板处理函数
+    """
     result = {}
+    extension = None
+    try:
+        compiled = compile_template(pdf_path)
+        result, extension = compiled["pages"], compiled["extension"]
+    except Exception as e:
+        logging.error(f"模板处理失败：{e}")
+    return result, extension
 
-    # 打开PDF文档
-    doc = fitz.open(pdf_path)
-    mode = fitz.open(mode_path)
-
-    for page_num in range(len(mode)):
-        logging.info(f"正在处理扫描文件第 {page_num + 1} 页...")
-
-        # 加载模板页面并转换为图像
-        m_page = mode.load_page(page_num)
-        m_pix = m_page.get_pixmap()
-
-        # 使用 BytesIO 在内存中处理图像
-        m_img = Image.frombytes("RGB", [m_pix.width, m_pix.height], m_pix.samples)
-        img_byte_arr = io.BytesIO()
-        m_img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        reference_img = cv2.imdecode(np.frombuffer(img_byte_arr.getvalue(), dtype=np.uint8), cv2.IMREAD_COLOR)
-
-        # 检测参考图片的边界线和画布大小
-        try:
-            pts_ref_border, (ref_canvas_width, ref_canvas_height) = detect_border(reference_img)
-        except ValueError as e:
-            logging.warning(f"页 {page_num + 1} 边界检测失败：{e}")
-            continue
-
-        # 加载扫描页面并转换为图像
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap()
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-        # 将PIL图像转换为OpenCV格式
-        img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-
-        # 提取感兴趣区域，并确保坐标为整数
-        x0, y0, x1, y1 = map(int, mode_extension)
-
-        if x0 < 0 or y0 < 0 or x1 > ref_canvas_width or y1 > ref_canvas_height:
-            logging.warning(f"页 {page_num + 1} 的模式扩展超出边界，跳过...")
-            continue
-
-        cropped_img = img_cv[y0:y1, x0:x1]
-
-        # 转换为灰度图并进行边缘检测
-        gray = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-
-        # 查找轮廓
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        if len(contours) == 0:
-            logging.warning(f"页 {page_num + 1} 未检测到轮廓，跳过...")
-            continue
-
-        largest_contour = max(contours, key=cv2.contourArea)
-
-        # 近似多边形拟合轮廓，得到四个角点
-        epsilon = 0.1 * cv2.arcLength(largest_contour, True)
-        approx = cv2.approxPolyDP(largest_contour, epsilon, True)
-
-        if len(approx) != 4:
-            logging.warning(f"页 {page_num + 1} 检测到的轮廓不是四边形，跳过...")
-            continue
-
-        pts_src = np.squeeze(approx).astype(np.float32)
-
-        # 确保 pts_src 的点按顺时针顺序排列（左上、右上、右下、左下）
-        def order_points(pts):
-            rect = np.zeros((4, 2), dtype=np.float32)
-            s = pts.sum(axis=1)
-            rect[0] = pts[np.argmin(s)]  # 左上
-            rect[2] = pts[np.argmax(s)]  # 右下
-            diff = np.diff(pts, axis=1)
-            rect[1] = pts[np.argmin(diff)]  # 右上
-            rect[3] = pts[np.argmax(diff)]  # 左下
-            return rect
-
-        pts_src = order_points(pts_src)
-
-        # 定义目标坐标为参考图片的边界线坐标
-        pts_dst = pts_ref_border
-
-        # 计算透视变换矩阵
-        matrix = cv2.getPerspectiveTransform(pts_src, pts_dst)
-
-        # 创建一个空白画布，大小为参考图片的画布大小
-        canvas = np.zeros((ref_canvas_height, ref_canvas_width, 3), dtype=np.uint8)
-
-        # 进行透视变换
-        warped_img = cv2.warpPerspective(cropped_img, matrix, (ref_canvas_width, ref_canvas_height))
 
-        # 将透视变换后的图像叠加到画布上
-        mask = warped_img != 0
-        canvas[mask] = warped_img[mask]
+def iter_scanned_pages(mode_path, pdf_path, mode_extension, workers=None, references=None, page_nums=None,
+                       ocr_dpi=None):
+    """
+    扫描件逐页处理生成器：每页渲染并矫正后立即产出，不在内存中保留整份扫描件的页面图像。
+    产出的图像只覆盖表格所在区域（见 scanned_pages.warp_region）。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param pdf_path: 扫描件 PDF 路径或已打开的 PdfDocument
+    :param mode_extension: 模板表格范围 (x0, y0, x1, y1)
+    :param workers: 并行处理的进程数，默认取 SCAN_WORKERS；不大于 1 时逐页串行处理。
+                    进程池在并发的请求之间共享（见 scanned_pages.get_scan_pool），单页扫描件同样送入进程池，
+                    渲染与矫正不占用调用方线程
+    :param references: 模板参考几何信息（见 scanned_pages.compile_references），为 None 时现场计算
+    :param page_nums: 要处理的页码，默认为模板的全部页
+    :param ocr_dpi: 扫描页的渲染与矫正分辨率，默认取 scanned_pages.OCR_DPI
+    :return: 生成 (页码, 矫正后的 BGR numpy 图像或 None)，按页码顺序
+    """
+    workers = scanned_pages.SCAN_WORKERS if workers is None else workers
+    if references is None:
+        references = scanned_pages.compile_references(mode_path)
+    page_nums = sorted(references["pages"]) if page_nums is None else list(page_nums)
+
+    with open_pdf(pdf_path) as scanned:
+        if workers > 1 and page_nums:
+            # 工作进程按路径打开文档，内存中的上传在此写入一次临时文件
+            yield from scanned_pages.iter_pages_parallel(references, scanned.local_path(), page_nums,
+                                                         mode_extension, workers, ocr_dpi, mode_path)
+        else:
+            for page_num in page_nums:
+                yield page_num, scanned_pages.process_page(mode_path, references, scanned.doc, page_num,
+                                                           mode_extension, ocr_dpi)
 
-        # 将OpenCV图像转换回PIL格式
-        processed_img = Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB))
 
-        # 存储结果
-        result[page_num] = processed_img
+def scanned_process(mode_path, pdf_path, mode_extension, workers=None, references=None):
+    """
+    扫描件处理函数
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param pdf_path: 扫描件 PDF 路径或已打开的 PdfDocument
+    :param mode_extension: 模板表格范围 (x0, y0, x1, y1)
+    :param workers: 并行处理的进程数，默认取 SCAN_WORKERS；不大于 1 时逐页串行处理
+    :param references: 模板参考几何信息（见 scanned_pages.compile_references），为 None 时现场计算
+    :return: {页码: 矫正后的 BGR numpy 图像}，按页码顺序排列，图像只覆盖表格所在区域
+    """
+    return {
+        page_num: processed_img
+        for page_num, processed_img in iter_scanned_pages(mode_path, pdf_path, mode_extension, workers, references)
+        if processed_img is not None
+    }
 
-    doc.close()
-    mode.close()
 
-    return result
+def crop_cell(img, box):
+    """
+    从 numpy 图像中裁剪单元格，坐标越界时截断到图像范围内。
+    :param img: numpy 图像
+    :param box: 整数坐标 (x0, y0, x1, y1)
+    :return: 裁剪得到的图像视图
+    """
+    height, width = img.shape[:2]
+    x0, y0, x1, y1 = box
+    x0, x1 = max(0, min(x0, width)), max(0, min(x1, width))
+    y0, y1 = max(0, min(y0, height)), max(0, min(y1, height))
+    return img[y0:y1, x0:x1]
 
 
-def linking(mode, scanned, approximate):
+def link_page(mode_page, img, approximate, num, scale=1.0, origin=(0, 0)):
+    """
+    单页匹配：从矫正后的 BGR 图像中切出该页灵活区域单元格，批量送入 OCR 识别。
+    启用空白检测时，墨迹过少的单元格不送 OCR，直接记为 "none"（见 blank_cells）。
+    :param mode_page: 该页模板的灵活区域 {(x0, y0, x1, y1): 逻辑链}
+    :param num: 页码
+    :param origin: 图像左上角在整页画布中的像素坐标（见 scanned_pages.warp_region）
+    :return: {识别文本: 逻辑链}
+    """
+    dx0, dy0, dx1, dy1 = approximate
+    ox, oy = origin
+    ink_map = None
+    if blank_cells.BLANK_DETECTION:
+        with metrics.stage("blank_detection", page=num):
+            ink_map = blank_cells.InkMap(img)
+    inset = blank_cells.BLANK_INSET
+
+    trees = []
+    crops = []
+    texts = []
+    for (x0, y0, x1, y1), tree in mode_page.items():
+        trees.append(tree)
+        if ink_map is not None:
+            inner = tuple(int(value * scale) for value in (x0 + inset, y0 + inset, x1 - inset, y1 - inset))
+            if ink_map.is_blank((inner[0] - ox, inner[1] - oy, inner[2] - ox, inner[3] - oy)):
+                texts.append("none")
+                continue
+        box = tuple(int(value * scale) for value in (x0 + dx0, y0 + dy0, x1 + dx1, y1 + dy1))
+        box = (box[0] - ox, box[1] - oy, box[2] - ox, box[3] - oy)
+        # 占位，识别后按顺序回填
+        texts.append(None)
+        crops.append(crop_cell(img, box))
+
+    metrics.count("cells", len(trees), page=num)
+    metrics.count("blank_cells", len(trees) - len(crops), page=num)
+    with metrics.stage("ocr", page=num):
+        recognized = iter(ocr_engine.get_engine().recognize(crops, page=num) if crops else [])
+    texts = [text if text is not None else next(recognized) for text in texts]
+    return dict(zip(texts, trees))
+
+
+def linking(mode, scanned, approximate, progress=None, scale=1.0, origins=None):
     """
     模板与扫描文件匹配函数
+    每页的灵活区域单元格直接从矫正后的 BGR 图像中切片，批量送入 OCR 识别，不落盘。
+    :param progress: 进度回调 progress(pages_done, pages_total)，每处理完一页调用一次
+    :param scale: 图像像素与模板 PDF 坐标之比（渲染 dpi / 72）
+    :param origins: {页码: 图像左上角在整页画布中的像素坐标}，缺省为 (0, 0)
     """
     result = {}
-    output_dir = "debug_images"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    dx0, dy0, dx1, dy1 = approximate
+    pages_total = min(len(mode), len(scanned))
 
     try:
-        for num in range(min(len(mode), len(scanned))):
-            img = scanned[num]
-            for (x0, y0, x1, y1), tree in mode[num].items():
-                x0, y0, x1, y1 = map(int, (x0 + dx0, y0 + dy0, x1 + dx1, y1 + dy1))
-                cropped_img = img.crop((x0, y0, x1, y1))
-                temp_path = os.path.join(output_dir, f"page_{num}_area_{x0}_{y0}_{x1}_{y1}.png")
-                cropped_img.save(temp_path)
-
-                raw_text = ocr.ocr(temp_path, cls=True)
-                text = raw_text[0][0][1][0] if raw_text[0] else "none"
-                result[text] = tree
-
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        for num in range(pages_total):
+            if num in scanned:
+                origin = (origins or {}).get(num, (0, 0))
+                result.update(link_page(mode[num], scanned[num], approximate, num, scale, origin))
+            if progress:
+                progress(num + 1, pages_total)
 
     except Exception as e:
         logging.error(f"模板与扫描文件匹配失败：{e}")
 
-    finally:
-        if os.path.exists(output_dir):
-            shutil.rmtree(output_dir)
-
     return result
 
 
-def process(mode_path, scanned_path):
+def iter_linked_pages(mode_path, scanned_path, compiled=None, progress=None, page_map=None, workers=None):
+    """
+    逐页处理流水线：每页渲染、矫正、识别并与模板匹配后立即产出，随后释放该页图像，
+    内存占用只与同时在处理中的页数有关，与扫描件总页数无关。
+    带有可用文本层的页直接从文本层读取单元格文字，不渲染、不矫正、不 OCR（见 text_layer），
+    其余页自动走图像流程。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param scanned_path: 扫描件 PDF 路径或已打开的 PdfDocument
+    :param compiled: 已编译的模板（见 compile_template），为 None 时现场编译
+    :param progress: 进度回调 progress(pages_done, pages_total)
+    :param page_map: 要处理的 [(扫描页码, 模板页码), ...]，默认扫描件第 n 页对应模板第 n 页
+    :param workers: 扫描页并行处理的进程数，默认取 SCAN_WORKERS
+    :return: 生成 (扫描页码, {识别文本: 逻辑链})，按 page_map 的顺序，矫正失败的页不产出
+    :raises Exception: 某页与模板匹配失败
+    """
+    if compiled is None:
+        compiled = compile_template(mode_path)
+    mode_result, mode_extension = compiled["pages"], compiled["extension"]
+    logging.info(f"模板处理结果：{mode_result}")
+
+    # 模板各页的参考边界随编译结果缓存，扫描件只需渲染并矫正自身页面
+    references = ensure_references(compiled, mode_path)
+    # 扫描页的表格区域按 OCR_DPI 渲染，单元格坐标按同一分辨率换算
+    ocr_dpi = scanned_pages.OCR_DPI or references["dpi"]
+    scale = ocr_dpi / 72
+    approximate = (0, 0, 0, 5)
+
+    with open_pdf(scanned_path) as scanned:
+        if page_map is None:
+            page_map = [(num, num) for num in range(min(len(mode_result), scanned.page_count))]
+        pages_total = len(page_map)
+
+        # 先逐页尝试文本层，只有读不出的页才交给图像流程
+        text_pages = {}
+        if text_layer.TEXT_LAYER:
+            anchors = ensure_anchors(compiled, mode_path)
+            for num, mode_num in page_map:
+                with metrics.stage("text_layer", page=num):
+                    page_result = text_layer.read_page(scanned.doc.load_page(num), anchors.get(mode_num),
+                                                       mode_result[mode_num])
+                if page_result is not None:
+                    metrics.count("text_layer_pages", page=num)
+                    metrics.count("cells", len(mode_result[mode_num]), page=num)
+                    text_pages[num] = page_result
+
+        # 参考几何信息按扫描页码索引，同一模板页可以对应多个扫描页
+        image_references = dict(references, pages={
+            num: references["pages"][mode_num] for num, mode_num in page_map if num not in text_pages
+        })
+        pages = iter_scanned_pages(mode_path, scanned, mode_extension, workers, image_references,
+                                   page_nums=image_references["pages"], ocr_dpi=ocr_dpi)
+        for done, (num, mode_num) in enumerate(page_map, 1):
+            if num in text_pages:
+                yield num, text_pages.pop(num)
+            else:
+                _, img = next(pages)
+                if img is not None:
+                    origin = scanned_pages.warp_region(references["pages"][mode_num], mode_extension,
+                                                       references["dpi"], ocr_dpi)[:2]
+                    try:
+                        page_result = link_page(mode_result[mode_num], img, approximate, num, scale, origin)
+                    except Exception as e:
+                        # 继续抛出，由调用方按失败处理，不把缺页的结果当作成功返回
+                        logging.error(f"模板与扫描文件匹配失败：{e}")
+                        raise
+                    del img
+                    yield num, page_result
+            if progress:
+                progress(done, pages_total)
+
+
+def iter_process(mode_path, scanned_path, compiled=None, progress=None):
+    """
+    流式处理函数：逐页产出该页的逻辑树，适合分块返回给客户端。
+    :return: 生成 (页码, 该页的逻辑树)
+    """
+    with metrics.track_request():
+        for num, page_result in iter_linked_pages(mode_path, scanned_path, compiled, progress):
+            with metrics.stage("tree_build", page=num):
+                page_tree = build_logic_tree(page_result)
+            yield num, page_tree
+
+
+def process(mode_path, scanned_path, compiled=None, progress=None, workers=None):
     """
     主处理函数
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param scanned_path: 扫描件 PDF 路径或已打开的 PdfDocument
+    :param compiled: 已编译的模板（见 compile_template），为 None 时现场编译
+    :param progress: 进度回调 progress(pages_done, pages_total)
+    :param workers: 扫描页并行处理的进程数，默认取 SCAN_WORKERS
     """
     try:
-        mode_result, mode_extension = mode_process(mode_path)
-        logging.info(f"模板处理结果：{mode_result}")
+        # 各阶段耗时记录到当前请求（见 utils.metrics）
+        with metrics.track_request():
+            # 逐页处理，只累积识别文本与逻辑链，页面图像处理完即释放
+            result = {}
+            for _, page_result in iter_linked_pages(mode_path, scanned_path, compiled, progress, workers=workers):
+                result.update(page_result)
+
+            with metrics.stage("tree_build"):
+                logic_tree = build_logic_tree(result)
+            return logic_tree
+
+    except Exception as e:
+        logging.error(f"主处理流程失败：{e}")
 
-        scanned_result = scanned_process(mode_path, scanned_path, mode_extension)
 
-        approximate = (0, 0, 0, 5)
-        result = linking(mode_result, scanned_result, approximate)
+def split_instances(mode_path, scanned, compiled, detect=False):
+    """
+    将扫描件切分为若干份模板实例。
+    :param scanned: 已打开的扫描件 PdfDocument
+    :param detect: 是否按页面缩略图的相似度识别实例边界（见 instances.split_detected），否则按模板页数依次切分
+    :return: [[(扫描页码, 模板页码), ...], ...]
+    """
+    if detect:
+        signatures = ensure_signatures(compiled, mode_path)
+        with metrics.stage("instance_detection"):
+            return instances.split_detected(scanned.doc, signatures)
+    return instances.split_fixed(scanned.page_count, compiled["page_count"])
 
-        logic_tree = build_logic_tree(result)
-        return logic_tree
 
+def iter_process_instances(mode_path, scanned_path, compiled=None, detect=False, workers=None, progress=None):
+    """
+    多实例处理：一个扫描件包含多份填写好的模板（整批扫描）时，切分为若干份实例分别建立逻辑树。
+    所有实例的页面连续送入同一条逐页流水线，扫描页在进程池中并行渲染、矫正，
+    某份实例的最后一页处理完即产出该实例的逻辑树。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param scanned_path: 扫描件 PDF 路径或已打开的 PdfDocument
+    :param compiled: 已编译的模板（见 compile_template），为 None 时现场编译
+    :param detect: 是否按页面相似度识别实例边界
+    :param workers: 扫描页并行处理的进程数，默认取 INSTANCE_WORKERS
+    :param progress: 进度回调 progress(pages_done, pages_total)，按所有实例的总页数计
+    :return: 生成 (实例序号, 该实例的扫描页码列表, 逻辑树)，按实例顺序
+    """
+    if compiled is None:
+        compiled = compile_template(mode_path)
+    workers = instances.INSTANCE_WORKERS if workers is None else workers
+
+    with metrics.track_request(), open_pdf(scanned_path) as scanned:
+        groups = split_instances(mode_path, scanned, compiled, detect)
+        metrics.count("instances", len(groups))
+        logging.info(f"扫描件切分为 {len(groups)} 份实例：{[[num for num, _ in group] for group in groups]}")
+        owner = {num: index for index, group in enumerate(groups) for num, _ in group}
+        page_map = [pair for group in groups for pair in group]
+
+        def finish(index):
+            with metrics.stage("tree_build"):
+                logic_tree = build_logic_tree(result)
+            result.clear()
+            return index, [num for num, _ in groups[index]], logic_tree
+
+        result = {}
+        current = 0
+        for num, page_result in iter_linked_pages(mode_path, scanned, compiled, progress, page_map, workers):
+            # 产出按 page_map 的顺序，出现下一份实例的页时，之前的实例都已处理完
+            while owner[num] > current:
+                yield finish(current)
+                current += 1
+            result.update(page_result)
+        while current < len(groups):
+            yield finish(current)
+            current += 1
+
+
+def process_instances(mode_path, scanned_path, compiled=None, detect=False, workers=None, progress=None):
+    """
+    多实例处理函数，参数见 iter_process_instances。
+    :return: [逻辑树, ...]，按实例顺序
+    """
+    try:
+        return [logic_tree for _, _, logic_tree in
+                iter_process_instances(mode_path, scanned_path, compiled, detect, workers, progress)]
     except Exception as e:
-        logging.error(f"主处理流程失败：{e}")
+        logging.error(f"多实例处理流程失败：{e}")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 import re
+from models.table_engine import PageTables, FitzPageTables, page_tables
+from models.word_matcher import get_matcher
 
 
 def get_filter_reg(stopwords_path):
@@ -133,13 +135,88 @@ def find_and_fix_remaining_must_words(page, unfixed_cells, must_reg, fixed_area)
     return fixed_area
 
 
+def single_pass_abstract(tables, filter_matcher, must_matcher):
+    """
+    基于单次表格检测的抽取逻辑，结果与 fixed_abstract + unfixed_abstract +
+    find_and_fix_remaining_must_words 的组合完全一致。
+    :param tables: PageTables 或 FitzPageTables 对象（表格与页面字符均只读取一次）
+    :param filter_matcher: 停用词匹配器（WordMatcher）
+    :param must_matcher: 必须词匹配器（WordMatcher）
+    :return: 固定区域字典, 非固定区域列表, 表格范围 (x_min, y_min, x_max, y_max)
+    """
+    fixed_area = {}
+    x_min = y_min = 1000
+    x_max = y_max = 0
+
+    for cell in tables.cells:
+        x0, y0, x1, y1 = cell
+        x_min = min(x_min, x0)
+        y_min = min(y_min, y0)
+        x_max = max(x_max, x1)
+        y_max = max(y_max, y1)
+
+        cell_width = x1 - x0
+        cell_height = y1 - y0
+        aspect_ratio = cell_width / cell_height if cell_height != 0 else float('inf')
+
+        if (cell_width < 15 or cell_height < 8 or
+                aspect_ratio > 15 or aspect_ratio < 0.05):
+            continue
+
+        cleaned_text = tables.cell_text(cell)
+
+        # 如果单元格文本包含任何停用词，则跳过该单元格
+        if not cleaned_text or cleaned_text.isspace() or filter_matcher.search(cleaned_text):
+            continue
+
+        fixed_area[cleaned_text] = (x0, y0, x1, y1)
+
+    # 查找并固定剩余的必须词所在的单元格
+    fixed_cell_set = set(fixed_area.values())
+    for cell in tables.cells:
+        if tuple(cell) in fixed_cell_set:
+            continue
+        cleaned_text = tables.cell_text(cell)
+        if must_matcher.search(cleaned_text):
+            x0, y0, x1, y1 = cell
+            fixed_area[cleaned_text] = (x0, y0, x1, y1)
+
+    # 更新非固定区域
+    fixed_cell_set = set(fixed_area.values())
+    unfixed_area = [cell for cell in tables.cells if tuple(cell) not in fixed_cell_set]
+
+    return fixed_area, unfixed_area, (x_min, y_min, x_max, y_max)
+
+
 def abstract(page, stopwords_path, must_words_path):
     """
     抽取给定页面中的有效文本信息，并返回details, fixed_area, unfixed_area。
+    每页只检测一次表格、只读取一次页面字符；词表在进程内只编译一次，文件修改后自动重新加载。
+    :param page: pdfplumber.Page / fitz.Page 对象，或 PageTables / FitzPageTables 对象
+    :param stopwords_path: 包含停用词的文本文件路径
+    :param must_words_path: 包含必须词的文本文件路径
+    :return: 包含有效文本及其原始文本的字典, 固定区域字典, 非固定区域列表, 表格范围
+    """
+    filter_matcher = get_matcher(stopwords_path)
+    must_matcher = get_matcher(must_words_path)
+
+    tables = page if isinstance(page, (PageTables, FitzPageTables)) else page_tables(page)
+    fixed_area, unfixed_area, extension = single_pass_abstract(tables, filter_matcher, must_matcher)
+
+    # 构造details字典
+    details = {text: text for text, location in fixed_area.items()}
+
+    return details, fixed_area, unfixed_area, extension
+
+
+def abstract_legacy(page, stopwords_path, must_words_path):
+    """
+    原有的逐单元格裁剪抽取实现（每页检测三次表格），保留用于与 abstract 的结果对照
+    （见 benchmarks/bench_abstract_parity.py）。
     :param page: pdfplumber.Page 对象
     :param stopwords_path: 包含停用词的文本文件路径
     :param must_words_path: 包含必须词的文本文件路径
-    :return: 包含有效文本及其原始文本的字典, 固定区域字典, 非固定区域列表
+    :return: 与 abstract 相同
     """
     filter_reg = get_filter_reg(stopwords_path)
     must_reg = get_must_reg(must_words_path)
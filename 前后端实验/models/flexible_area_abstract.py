@@ -1,38 +1,123 @@
-def find_father(logic, element):
+import numpy as np
+
+# 批量查找时每块处理的（非固定区域数 × 固定区域数）上限，控制临时数组的内存占用
+CHUNK_ELEMENTS = 1 << 20
+
+
+def build_parent_index(logic):
     """
-    找到给定元素的所有上级节点（父节点）。
+    建立子节点到父节点的索引，父节点按其在逻辑链字典中的顺序排列。
 
     :param logic: 逻辑链字典，格式为 {父节点: [子节点1, 子节点2, ...]}
+    :return: {子节点: [父节点1, 父节点2, ...]}
+    """
+    parents = {}
+    for key, values in logic.items():
+        for child in values:
+            parents.setdefault(child, {})[key] = None
+    return {child: list(keys) for child, keys in parents.items()}
+
+
+def build_linear_chains(parents):
+    """
+    对于祖先链是单一路径（每一级只有一个父节点）的节点，预先计算并缓存其全部上级节点。
+    共享同一段祖先链的节点复用同一份结果。
+
+    :param parents: build_parent_index 返回的索引
+    :return: {节点: 上级节点列表（由近到远）}，祖先存在分叉的节点不在其中
+    """
+    chains = {}
+    branching = set()
+    for start in parents:
+        path = []
+        node = start
+        # 向上走到第一个已知结果的节点、分叉节点或根节点
+        while node not in chains and node not in branching:
+            node_parents = parents.get(node, ())
+            if len(node_parents) > 1 or node in path:
+                branching.add(node)
+                break
+            path.append(node)
+            if not node_parents:
+                chains[node] = []
+                path.pop()
+                break
+            node = node_parents[0]
+
+        # 沿路径回填
+        tail = chains.get(node)
+        for child in reversed(path):
+            if tail is None:
+                branching.add(child)
+                continue
+            tail = [parents[child][0]] + tail
+            chains[child] = tail
+    return chains
+
+
+def find_father_indexed(parents, element, chains=None):
+    """
+    利用父节点索引查找给定元素的所有上级节点，结果与 find_father 完全相同（深度优先顺序）。
+
+    :param parents: build_parent_index 返回的索引
     :param element: 需要查找父节点的元素
+    :param chains: build_linear_chains 返回的单一路径祖先缓存，可选
     :return: 包含所有父节点的列表
     """
     father_list = []
     visited = set()  # 用于避免循环引用
+    chains = chains or {}
+
+    stack = [iter(parents.get(element, ()))]
+    while stack:
+        for key in stack[-1]:
+            if key in visited:
+                continue
+            father_list.append(key)
+            visited.add(key)
+            if key in chains:
+                # 单一路径的祖先链：依次加入，遇到已访问节点即停止（与逐级深度优先结果一致）
+                for ancestor in chains[key]:
+                    if ancestor in visited:
+                        break
+                    father_list.append(ancestor)
+                    visited.add(ancestor)
+            else:
+                stack.append(iter(parents.get(key, ())))
+            break
+        else:
+            stack.pop()
 
-    def dfs(node):
-        for key, values in logic.items():
-            if node in values and key not in visited:
-                father_list.append(key)
-                visited.add(key)
-                dfs(key)
-
-    dfs(element)
     return father_list
 
 
+def find_father(logic, element):
+    """
+    找到给定元素的所有上级节点（父节点）。
+
+    :param logic: 逻辑链字典，格式为 {父节点: [子节点1, 子节点2, ...]}
+    :param element: 需要查找父节点的元素
+    :return: 包含所有父节点的列表
+    """
+    return find_father_indexed(build_parent_index(logic), element)
+
+
 def edge_logic_find(logic):
     """
     找到逻辑链中的“边缘”元素及其所有上级节点。
+    父节点索引与单一路径祖先链只构建一次，所有边缘元素共享。
 
     :param logic: 逻辑链字典，格式为 {父节点: [子节点1, 子节点2, ...]}
     :return: 边缘元素及其所有上级节点的字典
     """
+    parents = build_parent_index(logic)
+    chains = build_linear_chains(parents)
+
     edge = {}
     for element in logic.keys():
         if not logic[element]:
-            edge[element] = find_father(logic, element)
             # 包括自身节点
-            edge[element].insert(0, element)
+            edge[element] = [element] + find_father_indexed(parents, element, chains)
 
     return edge
 
@@ -86,6 +171,55 @@ def find_nearest_fixed_areas(unfixed, fixed_area, unfixed_area):
     return nearest_x, nearest_y
 
 
+def find_nearest_fixed_areas_bulk(fixed_area, unfixed_area):
+    """
+    对所有 unfixed_area 一次性完成 find_nearest_fixed_areas 的查找，结果与逐个调用完全相同。
+    坐标保存在 NumPy 数组中，左侧/上侧最近邻按块整体比较；
+    “下方/右方紧邻 unfixed”只与 fixed_area 本身有关，对每个 fixed_area 预先判断一次。
+
+    :param fixed_area: 固定区域字典 {文本: (x0, y0, x1, y1), ...}
+    :param unfixed_area: [(x0, y0, x1, y1),...]
+    :return: [(最接近的 x 方向 fixed_area, 最接近的 y 方向 fixed_area), ...]，与 unfixed_area 一一对应
+    """
+    if not unfixed_area:
+        return []
+    texts = list(fixed_area)
+    if not texts:
+        return [(None, None)] * len(unfixed_area)
+
+    # 以 unfixed 左上角为键，判断 fixed_area 下方 / 右方是否紧邻 unfixed
+    corners = {(position[0], position[1]) for position in unfixed_area}
+    blocked_x = [fx0 == fx1 and (fx0, fy1) in corners for fx0, fy0, fx1, fy1 in fixed_area.values()]
+    blocked_y = [fy0 == fy1 and (fx1, fy0) in corners for fx0, fy0, fx1, fy1 in fixed_area.values()]
+
+    fx0, fy0, fx1, fy1 = np.asarray(list(fixed_area.values()), dtype=np.float64).T
+    unfixed = np.asarray(unfixed_area, dtype=np.float64)
+
+    result = []
+    step = max(1, CHUNK_ELEMENTS // len(texts))
+    for start in range(0, len(unfixed), step):
+        block = unfixed[start:start + step]
+        ux0, uy0, ux1, uy1 = (block[:, i:i + 1] for i in range(4))
+
+        # 左侧：fixed 的 y 范围覆盖 unfixed，按水平距离取最近（距离相同时取字典中靠前的一个）
+        left = (fx1 <= ux0) & (fy0 <= uy0) & (fy1 >= uy1)
+        nearest_y = np.where(left, ux0 - fx1, np.inf).argmin(axis=1)
+        has_y = left.any(axis=1)
+
+        # 上侧：fixed 的 x 范围覆盖 unfixed，按垂直距离取最近
+        above = (fy1 <= uy0) & (fx0 <= ux0) & (fx1 >= ux1)
+        nearest_x = np.where(above, uy0 - fy1, np.inf).argmin(axis=1)
+        has_x = above.any(axis=1)
+
+        for index_x, found_x, index_y, found_y in zip(nearest_x.tolist(), has_x.tolist(),
+                                                      nearest_y.tolist(), has_y.tolist()):
+            result.append((
+                texts[index_x] if found_x and not blocked_x[index_x] else None,
+                texts[index_y] if found_y and not blocked_y[index_y] else None,
+            ))
+    return result
+
+
 def flexible_abstract(logic, fixed_area, unfixed_area):
     """
     根据逻辑链和固定区域，确定哪些 unfixed_area 单元格属于“灵活区域”，并找到与之最近的 fixed_area 的逻辑链。
@@ -98,8 +232,8 @@ def flexible_abstract(logic, fixed_area, unfixed_area):
     result = {}
     edge_logic = edge_logic_find(logic)  # 预先计算所有边缘元素及其上级节点
 
-    for unfixed in unfixed_area:
-        nearest_x, nearest_y = find_nearest_fixed_areas(unfixed, fixed_area, unfixed_area)
+    nearest = find_nearest_fixed_areas_bulk(fixed_area, unfixed_area)
+    for unfixed, (nearest_x, nearest_y) in zip(unfixed_area, nearest):
 
         # 如果两个方向的 fixed_area 相同，则只保留一个逻辑链
         if nearest_x == nearest_y and nearest_x is not None:
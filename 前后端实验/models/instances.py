@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+多份扫描件合并为一个 PDF（扫描室整批扫描）时，把扫描件切分为若干份模板实例。
+默认按模板页数依次切分；也可以把每页缩成低分辨率的灰度缩略图与模板各页比较，
+按相似度识别每页对应的模板页，从而容忍缺页、插入的分隔页与空白页。
+"""
+import os
+import logging
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from utils.pdf_utils import open_pdf
+
+# 按实例处理时扫描页并行处理的进程数，实例之间不停顿，各实例的页面连续送入同一个进程池
+INSTANCE_WORKERS = int(os.environ.get("INSTANCE_WORKERS", os.cpu_count() or 1))
+
+# 页面缩略图的渲染分辨率：只需看清表格的整体布局
+SIGNATURE_DPI = 18
+
+# 缩略图统一缩放到的尺寸（宽, 高），与纸张方向无关
+SIGNATURE_SIZE = (32, 45)
+
+# 与所有模板页的相似度都低于该值的扫描页（空白页、分隔页等）不属于任何实例
+INSTANCE_MIN_SIMILARITY = float(os.environ.get("INSTANCE_MIN_SIMILARITY", 0.5))
+
+# 按顺序应出现的下一页与最相似的模板页相差不超过该值时，优先认定为下一页：
+# 模板各页布局相近时，相似度区分不出页码，此时退化为按顺序切分
+INSTANCE_SIMILARITY_MARGIN = 0.05
+
+
+def page_signature(page):
+    """
+    计算页面缩略图的特征向量：去均值后归一化，两页特征向量的内积即归一化相关系数。
+    :param page: fitz.Page
+    :return: float32 向量；空白页返回全零向量（与任何页的相似度都为 0）
+    """
+    pix = page.get_pixmap(dpi=SIGNATURE_DPI, colorspace=fitz.csGRAY)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    signature = cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    signature -= signature.mean()
+    norm = np.linalg.norm(signature)
+    return signature / norm if norm > 0 else signature
+
+
+def compile_signatures(mode_path):
+    """
+    计算模板每一页的缩略图特征，随编译后的模板一起缓存。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :return: (模板页数, 特征长度) 的 float32 数组
+    """
+    with open_pdf(mode_path) as mode:
+        return np.stack([page_signature(mode.doc.load_page(page_num)) for page_num in range(mode.page_count)])
+
+
+def split_fixed(page_count, mode_page_count):
+    """
+    按模板页数依次切分：第 i 份实例为扫描页 [i * n, (i + 1) * n)，末尾不足一份的页作为最后一份实例。
+    :param page_count: 扫描件页数
+    :param mode_page_count: 模板页数
+    :return: [[(扫描页码, 模板页码), ...], ...]
+    """
+    return [
+        [(start + offset, offset) for offset in range(min(mode_page_count, page_count - start))]
+        for start in range(0, page_count, mode_page_count)
+    ]
+
+
+def split_detected(doc, signatures, min_similarity=INSTANCE_MIN_SIMILARITY, margin=INSTANCE_SIMILARITY_MARGIN):
+    """
+    按缩略图相似度切分：逐页找出对应的模板页，模板页码不再递增时开始新的实例。
+    :param doc: 扫描件 fitz.Document
+    :param signatures: 模板各页的缩略图特征（见 compile_signatures）
+    :return: [[(扫描页码, 模板页码), ...], ...]，不属于任何实例的页不出现在结果中
+    """
+    instances = []
+    previous = None
+    for page_num in range(doc.page_count):
+        similarity = signatures @ page_signature(doc.load_page(page_num))
+        best = int(similarity.argmax())
+        if similarity[best] < min_similarity:
+            logging.info(f"扫描页 {page_num} 与模板各页都不相似（{similarity[best]:.2f}），跳过")
+            continue
+
+        expected = 0 if previous is None or previous + 1 >= len(signatures) else previous + 1
+        mode_num = expected if similarity[expected] >= similarity[best] - margin else best
+        if previous is None or mode_num <= previous:
+            instances.append([])
+        instances[-1].append((page_num, mode_num))
+        previous = mode_num
+    return instances
@@ -1,16 +1,42 @@
-def sort_fixed_area_into_lines(fixed_area):
-    all_rects = [(key, rect) for key, rect in fixed_area.items()]
-    sorted_rects = sorted(all_rects, key=lambda item: (item[1][1], item[1][0]))
+import os
+
+# 同一行单元格 y0（以及比较高度时 y1）允许的最大偏差（PDF 坐标），可设为 1 左右吸收表格线坐标的微小抖动。
+# 默认为 0：按坐标完全相等分行，与原实现的结果相同；设为正数后坐标相近的单元格会被归为同一行，
+# 分行与层级关系（以及由此得到的识别结果）可能与原实现不同
+ROW_TOLERANCE = float(os.environ.get("ROW_TOLERANCE", 0))
+
+
+def _y0_x0(item):
+    return item[1][1], item[1][0]
+
+
+def _x0(item):
+    return item[1][0]
+
+
+def sort_fixed_area_into_lines(fixed_area, tolerance=ROW_TOLERANCE):
+    """
+    按 y0 将矩形分行：按 (y0, x0) 排序后顺序扫描，y0 与当前行第一个矩形的 y0 相差不超过 tolerance 的归为同一行。
+
+    参数:
+    fixed_area (dict): {key: (x0, y0, x1, y1)}
+    tolerance (float): 同一行 y0 的最大偏差
+
+    返回:
+    lines_dict (dict): 键为每行第一个矩形的 y0，值为该行的 (key, rect) 列表
+    """
     lines_dict = {}
-    for key, rect in sorted_rects:
-        y0 = rect[1]  # 获取矩形的 y0 坐标
-        if y0 not in lines_dict:
-            lines_dict[y0] = []  # 如果 y0 不在字典中，则创建一个新的空列表
-        lines_dict[y0].append((key, rect))  # 将矩形添加到对应 y0 的列表中
+    anchor = line = None
+    for item in sorted(fixed_area.items(), key=_y0_x0):
+        y0 = item[1][1]  # 获取矩形的 y0 坐标
+        if line is None or y0 - anchor > tolerance:
+            anchor, line = y0, []  # 开始新的一行
+            lines_dict[anchor] = line
+        line.append(item)  # 将矩形添加到当前行
     return lines_dict
 
 
-def find_lower_right_rects(rects):
+def find_lower_right_rects(rects, tolerance=ROW_TOLERANCE):
 
     """
     找出同一行内每个矩形右侧且 y1 更小的矩形。
@@ -18,42 +44,51 @@ def find_lower_right_rects(rects):
     参数:
     rects (list of tuple): 每个元素是 (key, (x0, y0, x1, y1)) 的元组列表，
                            已按照 x0 排序。
+    tolerance (float): y1 之差不超过该值时视为等高
 
     返回:
     hierarchy (dict): 矩形之间的层次关系，键为矩形的 key，值为位于其右侧且更高的矩形 keys 列表。
     """
+    # 每个矩形右侧连续的更高矩形止于第一个不更高（y1 >= 当前 y1 - tolerance）的矩形，
+    # 用单调栈一次扫描求出所有矩形的截止位置
+    keys = [key for key, _ in rects]
+    bottoms = [rect[3] for _, rect in rects]
+    stop = [len(rects)] * len(rects)
+    pending = []  # 尚未找到截止位置的矩形下标，其 y1 自底向顶递减
+    for j, y1 in enumerate(bottoms):
+        while pending and bottoms[pending[-1]] - tolerance <= y1:
+            stop[pending.pop()] = j
+        pending.append(j)
+
     hierarchy = {}
-    for i, (key_i, rect_i) in enumerate(rects):
-        higher_right_rects = []
-        for j in range(i + 1, len(rects)):
-            key_j, rect_j = rects[j]
-            if rect_j[3] < rect_i[3]:  # 如果右侧矩形的 y1 小于当前矩形的 y1
-                higher_right_rects.append(key_j)
-            else:
-                break  # 因为已经按 x0 排序，所以可以在这里停止搜索
-        hierarchy[key_i] = higher_right_rects
+    for i, key_i in enumerate(keys):
+        hierarchy[key_i] = keys[i + 1:stop[i]]
     return hierarchy
 
 
-def fixed_to_flexible(fixed_area):
-    lines_by_y0 = sort_fixed_area_into_lines(fixed_area)
+def fixed_to_flexible(fixed_area, tolerance=ROW_TOLERANCE):
+    """
+    分行（排序 O(n log n)）后逐行求层级关系（单调栈 O(行内矩形数)），
+    总耗时为 O(n log n + 关系总数)。
+    """
     overall_hierarchy = {}
 
-    for y0, area in lines_by_y0.items():
-        # 对每一行中的矩形按 x0 进行排序
-        sorted_area = sorted(area, key=lambda item: item[1][0])
-        # 构建该行内的层次结构
-        line_hierarchy = find_lower_right_rects(sorted_area)
-        # 将该行的层次结构加入总体层次结构中
-        for key, higher_keys in line_hierarchy.items():
-            overall_hierarchy[key] = higher_keys
-
+    for area in sort_fixed_area_into_lines(fixed_area, tolerance).values():
+        if len(area) == 1:
+            # 只有一个矩形的行没有层级关系，不必排序与扫描
+            overall_hierarchy[area[0][0]] = []
+            continue
+        # 行内已按 (y0, x0) 排序：容差为 0 时 y0 都相同，x0 已有序；否则按 x0 重新排序
+        if tolerance > 0:
+            area.sort(key=_x0)
+        # 构建该行内的层次结构并加入总体层次结构中
+        overall_hierarchy.update(find_lower_right_rects(area, tolerance))
 
     return overall_hierarchy
 
 
-def search(fixed_area):
-    logic = fixed_to_flexible(fixed_area)
+def search(fixed_area, tolerance=ROW_TOLERANCE):
+    logic = fixed_to_flexible(fixed_area, tolerance)
 
     return logic
 
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+OCR 结果缓存：以单元格图像内容与模型配置的哈希为键，缓存识别出的文本。
+重复提交的扫描件、内容相同的单元格（日期、"无"、重复的姓名等）不再重复识别。
+内存中为 LRU，可选再加一层 SQLite 持久缓存，服务重启后仍然有效。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+# 内存中最多缓存的单元格数量，0 表示不启用缓存
+OCR_CACHE_SIZE = int(os.environ.get("OCR_CACHE_SIZE", 10000))
+
+# 持久缓存的 SQLite 文件路径，为空时只使用内存缓存
+OCR_CACHE_DB = os.environ.get("OCR_CACHE_DB", "")
+
+# 持久缓存最多保留的条目数，超出时按写入时间删除最早的条目；0 表示不限制
+OCR_CACHE_DB_SIZE = int(os.environ.get("OCR_CACHE_DB_SIZE", 1000000))
+
+# 持久缓存条目的保留时间（秒），默认 30 天；0 表示不过期
+OCR_CACHE_DB_TTL = float(os.environ.get("OCR_CACHE_DB_TTL", 30 * 24 * 3600))
+
+
+def hash_crop(crop, config=""):
+    """
+    计算单元格图像的缓存键：图像尺寸、数据类型与像素内容完全相同时键相同。
+    :param crop: numpy 图像
+    :param config: 模型配置，配置不同的识别结果互不复用
+    :return: blake2b 十六进制字符串
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{config}|{crop.shape}|{crop.dtype}|".encode("utf-8"))
+    digest.update(np.ascontiguousarray(crop).data)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    OCR 结果的两级缓存：内存 LRU + 可选的 SQLite。
+    SQLite 中的条目按写入时间清理：写入时顺带删除过期条目，并把条目数控制在 db_max_entries 以内。
+    """
+
+    def __init__(self, max_entries=OCR_CACHE_SIZE, db_path=None, db_max_entries=OCR_CACHE_DB_SIZE,
+                 db_ttl=OCR_CACHE_DB_TTL, sweep_interval=60):
+        """
+        :param max_entries: 内存中最多保留的条目数
+        :param db_path: SQLite 文件路径，为 None 时不持久化
+        :param db_max_entries: SQLite 中最多保留的条目数，0 表示不限制
+        :param db_ttl: SQLite 中条目的保留时间（秒），0 表示不过期
+        :param sweep_interval: 两次清理之间的最短间隔（秒）
+        """
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self.db_ttl = db_ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_created ON ocr_cache (created)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        批量查找缓存。
+        :param keys: 缓存键列表
+        :return: {键: 文本}，只包含命中的键
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+
+        missing = [key for key in set(keys) if key not in found]
+        disk_found = {}
+        if self.db_path and missing:
+            try:
+                with self._connect() as conn:
+                    # SQLite 单条语句的参数个数有限，分批查询
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        placeholders = ",".join("?" * len(chunk))
+                        rows = conn.execute(
+                            f"SELECT key, text FROM ocr_cache WHERE key IN ({placeholders})", chunk
+                        )
+                        disk_found.update(rows)
+            except sqlite3.Error as e:
+                logging.warning(f"读取 OCR 持久缓存失败：{e}")
+
+        with self._lock:
+            for key, text in disk_found.items():
+                self._remember(key, text)
+            found.update(disk_found)
+            hits = sum(1 for key in keys if key in found)
+            self._hits += hits
+            self._disk_hits += sum(1 for key in keys if key in disk_found)
+            self._misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """
+        写入识别结果。
+        :param items: {键: 文本}
+        """
+        if not items:
+            return
+        with self._lock:
+            for key, text in items.items():
+                self._remember(key, text)
+        if self.db_path:
+            now = time.time()
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO ocr_cache (key, text, created) VALUES (?, ?, ?)",
+                        [(key, text, now) for key, text in items.items()],
+                    )
+                    self._prune(conn, now)
+            except sqlite3.Error as e:
+                logging.warning(f"写入 OCR 持久缓存失败：{e}")
+
+    def _prune(self, conn, now):
+        """
+        清理持久缓存：删除过期条目，条目数超出上限时按写入时间删除最早的条目。
+        两次清理至少间隔 sweep_interval 秒。
+        """
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+
+        removed = 0
+        if self.db_ttl > 0:
+            removed += conn.execute("DELETE FROM ocr_cache WHERE created < ?", (now - self.db_ttl,)).rowcount
+        if self.db_max_entries > 0:
+            excess = conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0] - self.db_max_entries
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM ocr_cache WHERE key IN "
+                    "(SELECT key FROM ocr_cache ORDER BY created LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        if removed:
+            logging.info(f"OCR 持久缓存清理 {removed} 个条目")
+
+    def clear(self):
+        """
+        清空内存与持久缓存。
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM ocr_cache")
+
+    def stats(self):
+        """
+        :return: 命中、未命中次数与命中率等统计信息
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": bool(self.db_path),
+                "db_max_entries": self.db_max_entries,
+                "db_ttl": self.db_ttl,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def create_cache():
+    """
+    按环境变量创建 OCR 结果缓存，OCR_CACHE_SIZE 为 0 时返回 None（不缓存）。
+    """
+    if OCR_CACHE_SIZE <= 0:
+        return None
+    return OCRCache(OCR_CACHE_SIZE, OCR_CACHE_DB or None)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+OCR 引擎管理：PaddleOCR 模型在第一次使用时才加载（不在导入时加载），
+同一进程内的所有线程共享固定数量的常驻实例，实例用完归还队列。
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+from models.ocr_cache import create_cache, hash_crop
+from utils import metrics
+
+# 每批送入识别模型的单元格数量
+OCR_BATCH_SIZE = int(os.environ.get("OCR_BATCH_SIZE", 16))
+
+# 单元格位置已由模板确定，默认跳过文字检测模型，只做方向分类与识别；
+# 单元格内可能存在多行文字时可设置 OCR_USE_DET=1 退回检测 + 识别
+OCR_USE_DET = os.environ.get("OCR_USE_DET", "0") == "1"
+
+# 识别置信度低于该值的结果视为未识别到文字（"none"）。检测 + 识别时 PaddleOCR 按 drop_score（默认 0.5）
+# 丢弃低置信度的文本框，只做识别时没有这一步，噪点或几乎空白的单元格会被识别成乱码
+OCR_MIN_SCORE = float(os.environ.get("OCR_MIN_SCORE", 0.5))
+
+# 进程内常驻的 OCR 实例数量，每个实例各占一份模型内存
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", 1))
+
+# 启用 GPU 加速时设置 OCR_USE_GPU=1
+OCR_USE_GPU = os.environ.get("OCR_USE_GPU", "0") == "1"
+
+
+def recognize(ocr, crops, batch_size=OCR_BATCH_SIZE, use_det=OCR_USE_DET, page=None, min_score=OCR_MIN_SCORE):
+    """
+    批量识别单元格图像，全程在内存中进行，不写临时文件。
+    :param ocr: PaddleOCR 实例
+    :param crops: BGR 格式的 numpy 图像列表
+    :param batch_size: 每批识别的图像数量
+    :param use_det: 是否运行文字检测模型
+    :param page: 页码，用于按页统计 OCR 调用次数
+    :param min_score: 识别置信度下限，低于该值时记为 "none"
+    :return: 与 crops 一一对应的文本列表，未识别到文字或置信度过低时为 "none"
+    """
+    texts = ["none"] * len(crops)
+    valid = [idx for idx, crop in enumerate(crops) if crop.size > 0]
+
+    if use_det:
+        for idx in valid:
+            metrics.count("ocr_calls", page=page)
+            raw_text = ocr.ocr(crops[idx], cls=True)
+            if raw_text and raw_text[0]:
+                text, score = raw_text[0][0][1]
+                if score >= min_score:
+                    texts[idx] = text
+        return texts
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        metrics.count("ocr_calls", page=page)
+        raw_text = ocr.ocr([crops[idx] for idx in batch], det=False, cls=True)
+        rec_res = raw_text[0] if raw_text and raw_text[0] else []
+        for idx, (text, score) in zip(batch, rec_res):
+            if text and score >= min_score:
+                texts[idx] = text
+    return texts
+
+
+def create_paddleocr():
+    """
+    创建 PaddleOCR 实例。paddleocr 在此处才导入，导入本模块不会加载任何模型。
+    """
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=OCR_USE_GPU, rec_batch_num=OCR_BATCH_SIZE)
+
+
+class OCREngine:
+    """
+    OCR 实例池：最多创建 workers 个实例，按需懒加载；
+    调用方从队列中借用实例，全部实例忙碌时排队等待。
+    配置了结果缓存时，先按单元格图像哈希查缓存，只识别未命中的单元格。
+    """
+
+    def __init__(self, workers=OCR_WORKERS, factory=create_paddleocr, cache=None):
+        """
+        :param workers: 最多创建的实例数量
+        :param factory: 创建 OCR 实例的函数
+        :param cache: OCR 结果缓存（OCRCache），为 None 时不缓存
+        """
+        self.workers = max(1, workers)
+        self.factory = factory
+        self.cache = cache
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waiting = 0
+        self._in_use = 0
+        self._load_seconds = []
+        self._requests = 0
+
+    def _create(self):
+        start = time.perf_counter()
+        instance = self.factory()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._load_seconds.append(elapsed)
+        logging.info(f"OCR 模型加载完成，用时 {elapsed:.2f} 秒")
+        return instance
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            reserve = self._created < self.workers
+            if reserve:
+                self._created += 1
+            else:
+                self._waiting += 1
+
+        if reserve:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    @contextmanager
+    def acquire(self):
+        """
+        借用一个 OCR 实例，退出上下文时归还。
+        """
+        instance = self._take()
+        with self._lock:
+            self._in_use += 1
+            self._requests += 1
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(instance)
+
+    def reserve(self, workers):
+        """
+        将实例数量上限提高到至少 workers 个，例如按批量处理的并发数扩容。
+        新增的实例仍按需懒加载，只有并发识别确实排队时才会创建。
+        :param workers: 实例数量下限
+        """
+        with self._lock:
+            self.workers = max(self.workers, workers)
+
+    def warm_up(self, count=None):
+        """
+        预先加载实例，避免第一个请求承担模型加载时间。
+        :param count: 预加载的实例数量，默认加载到 workers 个
+        """
+        count = self.workers if count is None else min(count, self.workers)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._create())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def model_config(self, use_det=OCR_USE_DET):
+        """
+        :return: 影响识别结果的模型配置，作为缓存键的一部分
+        """
+        factory = getattr(self.factory, "__name__", type(self.factory).__name__)
+        return f"{factory}|lang=ch|cls=1|det={int(use_det)}|min_score={OCR_MIN_SCORE}"
+
+    def _recognize(self, crops, **kwargs):
+        with self.acquire() as instance:
+            return recognize(instance, crops, **kwargs)
+
+    def recognize(self, crops, **kwargs):
+        """
+        批量识别单元格图像，参数同模块级 recognize。
+        内容相同的单元格只识别一次，命中缓存的单元格不再借用 OCR 实例。
+        """
+        if self.cache is None:
+            return self._recognize(crops, **kwargs)
+
+        config = self.model_config(kwargs.get("use_det", OCR_USE_DET))
+        keys = [hash_crop(crop, config) if crop.size > 0 else None for crop in crops]
+        lookup = [key for key in keys if key is not None]
+        found = self.cache.get_many(lookup)
+
+        page = kwargs.get("page")
+        metrics.count("ocr_cache_hits", sum(1 for key in lookup if key in found), page=page)
+        metrics.count("ocr_cache_misses", sum(1 for key in lookup if key not in found), page=page)
+
+        # 未命中的键各取一个单元格送去识别
+        pending = {}
+        for idx, key in enumerate(keys):
+            if key is not None and key not in found and key not in pending:
+                pending[key] = idx
+        if pending:
+            texts = self._recognize([crops[idx] for idx in pending.values()], **kwargs)
+            recognized = dict(zip(pending, texts))
+            self.cache.put_many(recognized)
+            found.update(recognized)
+
+        return [found[key] if key is not None else "none" for key in keys]
+
+    def stats(self):
+        """
+        :return: 实例数量、加载耗时、排队情况与结果缓存命中情况等统计信息
+        """
+        cache_stats = self.cache.stats() if self.cache is not None else None
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "loaded": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "queue_depth": self._waiting,
+                "requests": self._requests,
+                "load_seconds": [round(value, 3) for value in self._load_seconds],
+                "cache": cache_stats,
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    获取进程内共享的 OCR 引擎（首次调用时创建，但不加载模型），结果缓存按环境变量配置。
+    :return: OCREngine 对象
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = OCREngine(cache=create_cache())
+    return _engine
+
+
+def set_engine(engine):
+    """
+    替换进程内共享的 OCR 引擎，例如在性能测试中换成确定性的替身。
+    :param engine: OCREngine 对象
+    :return: 原来的引擎（可能为 None）
+    """
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, engine
+    return previous
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+扫描件单页处理：模板页边界检测、扫描页裁剪与透视矫正。
+扫描页的表格外框不是干净的四边形时，改用与模板页 ORB 特征匹配得到的单应矩阵对齐（见 models.alignment）。
+本模块只依赖 PyMuPDF / OpenCV，不加载 OCR 模型，可在进程池的工作进程中导入。
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+
+from models import alignment
+from utils import metrics
+from utils.pdf_utils import open_pdf, render_page
+
+# 并行处理扫描页的进程数，0 或 1 表示逐页串行处理
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 0))
+
+# 页面渲染分辨率，72 dpi 时 1 像素对应 1 个 PDF 坐标单位（即 get_pixmap() 的默认值）
+RENDER_DPI = int(os.environ.get("RENDER_DPI", 72))
+
+# 扫描页表格区域的渲染与矫正分辨率，0 表示与 RENDER_DPI 相同；
+# 调高后只有表格区域以该分辨率渲染，小字号单元格的识别更准确
+OCR_DPI = int(os.environ.get("OCR_DPI", 0))
+
+# 矫正输出在表格范围之外保留的边距（PDF 坐标单位），须不小于单元格裁剪时的外扩量
+WARP_MARGIN = 10
+
+# 按裁剪矩形渲染时向外多渲染的像素数，去掉后与整页渲染再裁剪的像素完全一致
+CLIP_PADDING = 2
+
+# 以图片为主的扫描页在 OCR_DPI 低于 RENDER_DPI 的该倍数时仍整页渲染再裁剪：
+# 低分辨率下按裁剪矩形渲染时 MuPDF 对图片的降采样方式不同，噪声更明显，边界检测容易失败
+RASTER_CLIP_FACTOR = 2
+
+# 扫描页检测到的四边形面积不足模板边界面积的该比例时，视为误检（如外框断开后只框住了表格的一部分）
+QUAD_MIN_AREA_RATIO = 0.8
+
+# 每个工作进程最多同时保持打开的 PDF 文档数量
+WORKER_DOC_CACHE_SIZE = 4
+
+
+def order_points(pts):
+    """
+    将四个角点按左上、右上、右下、左下的顺序排列。
+    """
+    rect = np.zeros((4, 2), dtype=np.float32)
+    s = pts.sum(axis=1)
+    rect[0] = pts[np.argmin(s)]  # 左上
+    rect[2] = pts[np.argmax(s)]  # 右下
+    diff = np.diff(pts, axis=1)
+    rect[1] = pts[np.argmin(diff)]  # 右上
+    rect[3] = pts[np.argmax(diff)]  # 左下
+    return rect
+
+
+def detect_border(image):
+    """
+    边界检测函数
+    :param image: BGR 图像或灰度图像
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        raise ValueError("未检测到轮廓，请检查参考图片是否正确。")
+
+    largest_contour = max(contours, key=cv2.contourArea)
+    epsilon = 0.1 * cv2.arcLength(largest_contour, True)
+    approx = cv2.approxPolyDP(largest_contour, epsilon, True)
+
+    if len(approx) != 4:
+        raise ValueError("检测到的轮廓不是四边形，请检查参考图片是否正确。")
+
+    pts_border = np.squeeze(approx).astype(np.float32)
+
+    pts_border = order_points(pts_border)
+    canvas_height, canvas_width = image.shape[:2]
+    return pts_border, (canvas_width, canvas_height)
+
+
+def find_quad(gray):
+    """
+    在灰度图中查找最大的外轮廓，并拟合为四边形。
+    :param gray: 灰度图像，边缘检测的参数按 RENDER_DPI 下的图像调校
+    :return: (按左上、右上、右下、左下排列的四个角点, None)；失败时为 (None, 失败原因)
+    """
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+
+    # 查找轮廓
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) == 0:
+        return None, "未检测到轮廓"
+
+    # 按凸包面积选取最大轮廓：外框的边缘轮廓往往不闭合（沿线条往返），其自身面积接近 0
+    largest_hull = max((cv2.convexHull(contour) for contour in contours), key=cv2.contourArea)
+
+    # 近似多边形拟合轮廓，得到四个角点
+    epsilon = 0.1 * cv2.arcLength(largest_hull, True)
+    approx = cv2.approxPolyDP(largest_hull, epsilon, True)
+    if len(approx) != 4:
+        return None, "检测到的轮廓不是四边形"
+
+    # 确保角点按顺时针顺序排列（左上、右上、右下、左下）
+    return order_points(np.squeeze(approx).astype(np.float32)), None
+
+
+def touches_edge(pts, shape, tolerance=1):
+    """
+    判断四边形是否有角点落在图像边缘：外框超出检测区域时，拟合出的是被截断的轮廓，角点不准确。
+    :param pts: 四个角点
+    :param shape: 图像的 shape
+    """
+    height, width = shape[:2]
+    return bool((pts.min(axis=0) <= tolerance).any()
+                or (pts[:, 0] >= width - 1 - tolerance).any() or (pts[:, 1] >= height - 1 - tolerance).any())
+
+
+class FeaturesRequired(Exception):
+    """
+    扫描页需要与模板特征匹配对齐，而参考几何信息中还没有提取特征（见 ensure_features）。
+    """
+
+
+def render_reference(m_page, dpi=RENDER_DPI):
+    """
+    渲染模板页并检测参考边界。模板不变时结果不变，随编译后的模板一起缓存。
+    对齐用的 ORB 特征只在扫描页外框检测失败时才需要，不在此提取（见 ensure_features）。
+    :param m_page: 模板 fitz.Page
+    :param dpi: 渲染分辨率
+    :return: {"border": 参考边界四个角点（检测失败时为 None）, "canvas": (宽, 高), "page_size": 页面尺寸,
+              "page": 模板页码}
+    """
+    with metrics.stage("render", page=m_page.number):
+        reference_img = cv2.cvtColor(render_page(m_page, dpi=dpi), cv2.COLOR_RGB2GRAY)
+    canvas_height, canvas_width = reference_img.shape[:2]
+    try:
+        with metrics.stage("border_detection", page=m_page.number):
+            pts_ref_border, _ = detect_border(reference_img)
+    except ValueError as e:
+        logging.warning(f"模板第 {m_page.number + 1} 页边界检测失败：{e}")
+        pts_ref_border = None
+    reference = {
+        "border": pts_ref_border,
+        "canvas": (canvas_width, canvas_height),
+        "page_size": (m_page.rect.width, m_page.rect.height),
+        "page": m_page.number,
+    }
+    return reference
+
+
+def reference_features(m_page, reference, dpi=RENDER_DPI, mode_extension=None):
+    """
+    提取模板页对齐用的 ORB 特征。
+    :param m_page: 模板 fitz.Page
+    :param reference: 该页的参考几何信息（见 render_reference）
+    :param dpi: 渲染分辨率，须与 reference 的渲染分辨率一致
+    :param mode_extension: 模板表格范围 (x0, y0, x1, y1)，PDF 坐标；给出时只在 warp_region 区域内提取特征，
+                           扫描页只渲染表格区域，区域之外的特征不会被匹配到
+    :return: 特征点坐标换算到整页画布的特征（见 alignment.compute_features），提取失败时为 None
+    """
+    with metrics.stage("render", page=m_page.number):
+        reference_img = cv2.cvtColor(render_page(m_page, dpi=dpi), cv2.COLOR_RGB2GRAY)
+    x0, y0, x1, y1 = 0, 0, *reference["canvas"]
+    if mode_extension is not None:
+        x0, y0, x1, y1 = warp_region(reference, mode_extension, dpi, dpi)
+    with metrics.stage("feature_alignment", page=m_page.number):
+        features = alignment.compute_features(reference_img[y0:y1, x0:x1])
+    if features is not None:
+        # 特征点坐标换算回整页画布
+        features["points"] += np.float32([x0, y0])
+    return features
+
+
+def ensure_features(mode_path, reference, dpi, mode_extension):
+    """
+    确保参考几何信息中带有对齐特征：第一次有扫描页需要特征匹配时才提取，写回 reference，
+    随编译结果保留在内存中，之后的请求直接使用。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :return: 对齐特征，提取失败时为 None
+    """
+    if "features" not in reference:
+        with open_pdf(mode_path) as mode:
+            reference["features"] = reference_features(mode.doc.load_page(reference["page"]), reference, dpi,
+                                                        mode_extension)
+    return reference["features"]
+
+
+def compile_references(mode_path, dpi=RENDER_DPI):
+    """
+    计算模板每一页的参考边界与画布大小，对齐特征按需提取（见 ensure_features）。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :param dpi: 渲染分辨率
+    :return: {"dpi": dpi, "pages": {页码: render_reference 的结果}}
+    """
+    with open_pdf(mode_path) as mode:
+        pages = {
+            page_num: render_reference(mode.doc.load_page(page_num), dpi)
+            for page_num in range(mode.page_count)
+        }
+    return {"dpi": dpi, "pages": pages}
+
+
+def warp_region(reference, mode_extension, dpi=RENDER_DPI, ocr_dpi=None):
+    """
+    计算矫正输出图像覆盖的区域：表格范围外扩 WARP_MARGIN，截断到页面画布之内。
+    :param reference: 该页模板的参考几何信息（见 render_reference）
+    :param mode_extension: 模板表格范围 (x0, y0, x1, y1)，PDF 坐标
+    :param dpi: 参考边界的渲染分辨率
+    :param ocr_dpi: 扫描页的渲染与矫正分辨率，默认取 OCR_DPI（为 0 时与 dpi 相同）
+    :return: ocr_dpi 下整页画布中的像素坐标 (x0, y0, x1, y1)
+    """
+    ocr_dpi = ocr_dpi or OCR_DPI or dpi
+    scale = ocr_dpi / 72
+    margin = int(WARP_MARGIN * scale)
+    canvas_width, canvas_height = (int(round(value * ocr_dpi / dpi)) for value in reference["canvas"])
+    x0, y0, x1, y1 = (int(value * scale) for value in mode_extension)
+    return max(0, x0 - margin), max(0, y0 - margin), min(canvas_width, x1 + margin), min(canvas_height, y1 + margin)
+
+
+def render_clip(page, box, dpi):
+    """
+    只渲染页面中的一块区域。
+    :param box: dpi 下整页画布中的像素坐标 (x0, y0, x1, y1)
+    :return: 该区域的 RGB numpy 图像，与整页渲染后再裁剪得到的像素相同
+    """
+    scale = dpi / 72
+    x0, y0, x1, y1 = box
+    pad = CLIP_PADDING
+    # 裁剪矩形边缘的一行像素与整页渲染略有差异，多渲染几个像素后再切掉
+    clip = fitz.Rect((x0 - pad) / scale, (y0 - pad) / scale, (x1 + pad) / scale, (y1 + pad) / scale)
+    pixels = render_page(page, dpi=dpi, clip=clip)
+    left, top = min(pad, x0), min(pad, y0)
+    return pixels[top:top + y1 - y0, left:left + x1 - x0]
+
+
+def is_raster_page(page):
+    """
+    判断页面是否主要由图片构成（扫描得到的页面），图片覆盖超过页面面积一半即视为是。
+    """
+    page_area = abs(page.rect)
+    return any(abs(fitz.Rect(info["bbox"]) & page.rect) > page_area / 2 for info in page.get_image_info())
+
+
+def render_region(page, box, dpi, min_raster_clip_dpi=0):
+    """
+    渲染扫描页的一块区域：矢量页按裁剪矩形渲染；图片页在 dpi 低于 min_raster_clip_dpi 时整页渲染再裁剪。
+    :param box: dpi 下整页画布中的像素坐标 (x0, y0, x1, y1)
+    :param min_raster_clip_dpi: 图片页按裁剪矩形渲染的最低分辨率
+    :return: 该区域的 RGB numpy 图像
+    """
+    if dpi < min_raster_clip_dpi and is_raster_page(page):
+        x0, y0, x1, y1 = box
+        return render_page(page, dpi=dpi)[y0:y1, x0:x1]
+    return render_clip(page, box, dpi)
+
+
+def process_scanned_page(reference, doc, page_num, mode_extension, dpi=RENDER_DPI, ocr_dpi=None):
+    """
+    处理扫描件的单页：只渲染扫描页的表格区域，透视矫正到模板画布中的 warp_region 区域。
+    :param reference: 该页模板的参考几何信息（见 render_reference）
+    :param doc: 扫描件 fitz.Document
+    :param page_num: 页码（从 0 开始）
+    :param mode_extension: 模板表格范围 (x0, y0, x1, y1)，PDF 坐标
+    :param dpi: 参考边界的渲染分辨率，须与 reference 的渲染分辨率一致
+    :param ocr_dpi: 扫描页的渲染与矫正分辨率，默认取 OCR_DPI（为 0 时与 dpi 相同）
+    :return: 矫正后的 BGR numpy 图像，覆盖 warp_region 返回的区域；无法处理时返回 None
+    :raises FeaturesRequired: 需要特征匹配而 reference 中尚未提取特征（见 process_page）
+    """
+    logging.info(f"正在处理扫描文件第 {page_num + 1} 页...")
+
+    # 参考图片的边界线与画布大小已在模板编译时得到；对齐特征尚未提取时视为可用，真正用到时再提取
+    pts_ref_border = reference["border"]
+    use_features = alignment.ALIGN_FEATURES and reference.get("features", True) is not None
+    if pts_ref_border is None and not use_features:
+        logging.warning(f"页 {page_num + 1} 模板边界检测失败，跳过...")
+        return None
+    ref_canvas_width, ref_canvas_height = reference["canvas"]
+
+    # 提取感兴趣区域（换算到渲染分辨率下的像素坐标），并确保坐标为整数
+    x0, y0, x1, y1 = (int(value * dpi / 72) for value in mode_extension)
+
+    if x0 < 0 or y0 < 0 or x1 > ref_canvas_width or y1 > ref_canvas_height:
+        logging.warning(f"页 {page_num + 1} 的模式扩展超出边界，跳过...")
+        return None
+
+    # 渲染、检测与矫正输出都使用 warp_region 区域：表格范围外留有边距，扫描页的外框略有偏移或旋转时不会被截断
+    ocr_dpi = ocr_dpi or OCR_DPI or dpi
+    dx0, dy0, dx1, dy1 = warp_region(reference, mode_extension, dpi, dpi)
+    detect_size = (dx1 - dx0, dy1 - dy0)
+    wx0, wy0, wx1, wy1 = warp_region(reference, mode_extension, dpi, ocr_dpi)
+
+    with metrics.stage("render", page=page_num):
+        # 只渲染扫描页的表格区域（见 render_region）
+        page = doc.load_page(page_num)
+        img_rgb = render_region(page, (wx0, wy0, wx1, wy1), ocr_dpi, dpi * RASTER_CLIP_FACTOR)
+
+        # 转换为 OpenCV 使用的 BGR 格式
+        cropped_img = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+
+    with metrics.stage("border_detection", page=page_num):
+        # 转换为灰度图并检测表格外框；边缘检测的参数按 dpi 调校，高分辨率渲染时先缩小到 dpi 再检测
+        gray = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
+        if ocr_dpi != dpi:
+            gray = cv2.resize(gray, detect_size, interpolation=cv2.INTER_AREA)
+        if pts_ref_border is not None:
+            pts_src, reason = find_quad(gray)
+            if pts_src is not None and (cv2.contourArea(pts_src)
+                                        < QUAD_MIN_AREA_RATIO * cv2.contourArea(pts_ref_border)):
+                pts_src, reason = None, "检测到的四边形远小于模板边界"
+            elif pts_src is not None and use_features and touches_edge(pts_src, gray.shape):
+                # 外框被检测区域截断，有模板特征时改用特征匹配
+                pts_src, reason = None, "检测到的四边形被区域边缘截断"
+        else:
+            pts_src, reason = None, "模板边界检测失败"
+
+    # 检测尺寸（dpi 下的区域）到渲染尺寸（ocr_dpi 下的区域）的缩放
+    detect_scale = np.float32([(wx1 - wx0) / detect_size[0], (wy1 - wy0) / detect_size[1]])
+
+    if pts_src is not None:
+        if ocr_dpi != dpi:
+            pts_src *= detect_scale
+
+        # 定义目标坐标为参考图片的边界线坐标（换算到 ocr_dpi，并平移到输出区域的原点）
+        pts_dst = (pts_ref_border * np.float32(ocr_dpi / dpi) - np.float32([wx0, wy0])).astype(np.float32)
+
+        # 计算透视变换矩阵
+        matrix = cv2.getPerspectiveTransform(pts_src, pts_dst)
+    else:
+        # 外框不是干净的四边形：在检测图像的金字塔上与模板特征匹配，估计区域到模板画布的单应矩阵
+        homography = None
+        if use_features:
+            if "features" not in reference:
+                raise FeaturesRequired(page_num)
+            with metrics.stage("feature_alignment", page=page_num):
+                homography = alignment.estimate_homography(alignment.compute_features(gray), reference["features"])
+        if homography is None:
+            logging.warning(f"页 {page_num + 1} {reason}，跳过...")
+            return None
+        metrics.count("feature_alignments", page=page_num)
+
+        # 渲染图像 -> 检测图像 -> 模板画布（dpi）-> 模板画布（ocr_dpi）-> 输出区域，合并为一个矩阵
+        to_detect = np.diag([1 / detect_scale[0], 1 / detect_scale[1], 1.0])
+        to_output = np.array([[ocr_dpi / dpi, 0, -wx0], [0, ocr_dpi / dpi, -wy0], [0, 0, 1]])
+        matrix = to_output @ homography @ to_detect
+
+    # 进行透视变换，只输出表格所在的区域（变换范围之外填充为黑色）
+    with metrics.stage("warp", page=page_num):
+        return cv2.warpPerspective(cropped_img, matrix, (wx1 - wx0, wy1 - wy0))
+
+
+def process_page(mode_path, references, doc, page_num, mode_extension, ocr_dpi=None):
+    """
+    在当前进程中处理扫描件的单页（见 process_scanned_page），需要时先提取模板特征再重新处理。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument，用于按需提取对齐特征
+    :param references: 模板参考几何信息（见 compile_references）
+    """
+    reference = references["pages"][page_num]
+    try:
+        return process_scanned_page(reference, doc, page_num, mode_extension, references["dpi"], ocr_dpi)
+    except FeaturesRequired:
+        ensure_features(mode_path, reference, references["dpi"], mode_extension)
+        return process_scanned_page(reference, doc, page_num, mode_extension, references["dpi"], ocr_dpi)
+
+
+_worker_docs = OrderedDict()
+
+
+def _open_cached(path):
+    """
+    在工作进程内按 (路径, 修改时间, 大小) 缓存打开的文档，同一文件的多页任务复用同一句柄。
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    doc = _worker_docs.get(key)
+    if doc is None:
+        doc = fitz.open(path)
+        _worker_docs[key] = doc
+        while len(_worker_docs) > WORKER_DOC_CACHE_SIZE:
+            _, stale = _worker_docs.popitem(last=False)
+            stale.close()
+    else:
+        _worker_docs.move_to_end(key)
+    return doc
+
+
+def _scan_page_task(reference, pdf_path, page_num, mode_extension, dpi, ocr_dpi):
+    # 工作进程中的阶段耗时随结果一起返回，由主进程合并
+    with metrics.collect() as timings:
+        image = process_scanned_page(reference, _open_cached(pdf_path), page_num, mode_extension, dpi, ocr_dpi)
+    return image, timings.to_dict()
+
+
+# {进程数: 进程池}：不同的请求可能使用不同的进程数（SCAN_WORKERS / INSTANCE_WORKERS），
+# 各进程数的进程池一经创建便一直复用，不会在其他请求使用时被关闭
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_scan_pool(workers):
+    """
+    获取扫描页处理进程池，进程池在多次请求之间复用。
+    使用 spawn 方式启动，工作进程只导入本模块，不会复制主进程中的 OCR 模型。
+    :param workers: 进程数
+    :return: ProcessPoolExecutor
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def shutdown_scan_pool():
+    """
+    关闭所有扫描页处理进程池。在 multiprocessing 的子进程中使用进程池时，须在子进程退出前调用：
+    子进程退出时不会通知进程池的工作进程结束，却会等待它们退出。
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+def iter_pages_parallel(references, pdf_path, page_nums, mode_extension, workers, ocr_dpi=None, mode_path=None):
+    """
+    将扫描页分发到进程池，按页码顺序逐页产出结果。
+    同时提交的任务不超过 workers + 1 个，已产出的页面图像由调用方释放后不再驻留内存。
+    工作进程需要尚未提取的对齐特征时，在主进程中提取（写回 references）后重新提交该页。
+    :param references: 模板参考几何信息（见 compile_references）
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument，用于按需提取对齐特征
+    :return: 生成 (页码, 矫正后的 BGR 图像或 None)
+    """
+    pool = get_scan_pool(workers)
+    pdf_path = os.path.abspath(pdf_path)
+    page_nums = list(page_nums)
+    pending = deque()
+    submitted = 0
+    while submitted < len(page_nums) or pending:
+        while submitted < len(page_nums) and len(pending) <= workers:
+            page_num = page_nums[submitted]
+            pending.append((page_num, pool.submit(_scan_page_task, references["pages"][page_num], pdf_path,
+                                                  page_num, mode_extension, references["dpi"], ocr_dpi)))
+            submitted += 1
+        page_num, future = pending.popleft()
+        try:
+            image, timings = future.result()
+        except FeaturesRequired:
+            reference = references["pages"][page_num]
+            ensure_features(mode_path, reference, references["dpi"], mode_extension)
+            image, timings = pool.submit(_scan_page_task, reference, pdf_path, page_num, mode_extension,
+                                         references["dpi"], ocr_dpi).result()
+        metrics.merge(timings)
+        yield page_num, image
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import os
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+from pdfplumber import utils as plumber_utils
+
+# 模板表格抽取后端：pdfplumber（默认）或 pymupdf，两者输出相同结构的单元格与文本
+TABLE_BACKEND = os.environ.get("TABLE_BACKEND", "pdfplumber")
+
+# 表格检测策略，与 details_abstract 原有设置保持一致
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+}
+
+# 字符空间索引的网格边长（PDF 坐标单位）
+GRID_SIZE = 24
+
+# 拼接单元格文本时，字符顶部坐标相差不超过该值视为同一行（与 pdfplumber 的默认 y_tolerance 相同）
+LINE_TOLERANCE = 3
+
+
+class CharIndex:
+    """
+    页面字符的网格空间索引。
+    每个字符按其外接框登记到所有覆盖的网格中，查询单元格时只检查单元格覆盖到的网格，
+    代替逐个单元格调用 page.crop(...) 扫描整页字符。
+    """
+
+    def __init__(self, chars, grid_size=GRID_SIZE):
+        """
+        :param chars: 页面字符列表（pdfplumber 的 char 字典）
+        :param grid_size: 网格边长
+        """
+        self.chars = chars
+        self.grid_size = grid_size
+        self.buckets = {}
+        for idx, char in enumerate(chars):
+            for key in self._keys((char["x0"], char["top"], char["x1"], char["bottom"])):
+                self.buckets.setdefault(key, []).append(idx)
+
+    def _keys(self, bbox):
+        x0, top, x1, bottom = bbox
+        size = self.grid_size
+        for col in range(int(x0 // size), int(x1 // size) + 1):
+            for row in range(int(top // size), int(bottom // size) + 1):
+                yield col, row
+
+    def query(self, bbox):
+        """
+        返回与 bbox 相交的字符，并按 bbox 裁剪坐标，结果与 page.crop(bbox).chars 一致。
+        :param bbox: (x0, top, x1, bottom)
+        :return: 裁剪后的字符列表，保持页面中的原始顺序
+        """
+        candidates = set()
+        for key in self._keys(bbox):
+            candidates.update(self.buckets.get(key, ()))
+        clipped = (plumber_utils.clip_obj(self.chars[idx], bbox) for idx in sorted(candidates))
+        return [char for char in clipped if char is not None]
+
+
+class PageTables:
+    """
+    单页的表格与文字：表格只检测一次，页面字符只读取一次，单元格文本按需计算并缓存。
+    """
+
+    def __init__(self, page, table_settings=None):
+        """
+        :param page: pdfplumber.Page 对象
+        :param table_settings: 表格检测策略，默认使用 TABLE_SETTINGS
+        """
+        self.page = page
+        tables = page.find_tables(table_settings or TABLE_SETTINGS)
+        self.cells = [cell for table in tables for cell in table.cells if cell is not None]
+        self.index = CharIndex(page.chars)
+        self._texts = {}
+
+    def cell_text(self, cell):
+        """
+        返回单元格去除换行和空格后的文本，与
+        page.crop(bbox=cell).extract_text().replace('\\n', '').replace(' ', '') 相同。
+        :param cell: 单元格坐标 (x0, y0, x1, y1)
+        :return: 清洗后的文本
+        """
+        cell = tuple(cell)
+        if cell not in self._texts:
+            x0, top, x1, bottom = cell
+            chars = self.index.query(cell)
+            text = plumber_utils.chars_to_textmap(
+                chars, layout_bbox=cell, layout_width=x1 - x0, layout_height=bottom - top
+            ).as_string if chars else ""
+            self._texts[cell] = text.replace('\n', '').replace(' ', '')
+        return self._texts[cell]
+
+
+def chars_to_text(chars, line_tolerance=LINE_TOLERANCE):
+    """
+    将字符按行（自上而下）、行内按 x 坐标（自左向右）拼接为文本，行与行之间不加分隔。
+    :param chars: 字符字典列表，含 text、x0、top
+    :return: 拼接后的文本
+    """
+    lines = []
+    for char in sorted(chars, key=lambda char: (char["top"], char["x0"])):
+        if lines and char["top"] - lines[-1][0] <= line_tolerance:
+            lines[-1][1].append(char)
+        else:
+            lines.append((char["top"], [char]))
+    return "".join(char["text"] for _, line in lines for char in sorted(line, key=lambda char: char["x0"]))
+
+
+class FitzPageTables:
+    """
+    基于 PyMuPDF 的单页表格与文字，接口与 PageTables 相同：
+    表格由 Page.find_tables 检测，字符由 get_text("rawdict") 一次读出，单元格文本按需计算并缓存。
+    """
+
+    def __init__(self, page, table_settings=None):
+        """
+        :param page: fitz.Page 对象
+        :param table_settings: 表格检测策略，默认使用 TABLE_SETTINGS
+        """
+        settings = table_settings or TABLE_SETTINGS
+        self.page = page
+        tables = page.find_tables(
+            vertical_strategy=settings.get("vertical_strategy", "lines"),
+            horizontal_strategy=settings.get("horizontal_strategy", "lines"),
+        )
+        self.cells = [tuple(cell) for table in tables.tables for cell in table.cells if cell is not None]
+        chars = []
+        for block in page.get_text("rawdict")["blocks"]:
+            for line in block.get("lines", ()):
+                for span in line["spans"]:
+                    for char in span["chars"]:
+                        x0, top, x1, bottom = char["bbox"]
+                        chars.append({"text": char["c"], "x0": x0, "top": top, "x1": x1, "bottom": bottom})
+        self.index = CharIndex(chars)
+        self._texts = {}
+
+    def cell_text(self, cell):
+        """
+        返回单元格去除换行和空格后的文本，与 PageTables.cell_text 的规则相同。
+        :param cell: 单元格坐标 (x0, y0, x1, y1)
+        :return: 清洗后的文本
+        """
+        cell = tuple(cell)
+        if cell not in self._texts:
+            text = chars_to_text(self.index.query(cell))
+            self._texts[cell] = text.replace('\n', '').replace(' ', '')
+        return self._texts[cell]
+
+
+# 表格抽取后端：名称 -> 单页表格类
+BACKENDS = {
+    "pdfplumber": PageTables,
+    "pymupdf": FitzPageTables,
+}
+
+
+def page_tables(page, backend=None):
+    """
+    为单页创建表格对象：fitz.Page 使用 FitzPageTables，pdfplumber.Page 使用 PageTables。
+    :param backend: 后端名称，默认按页面类型选择
+    :raises ValueError: 未知的后端
+    """
+    if backend is None:
+        backend = "pymupdf" if isinstance(page, fitz.Page) else "pdfplumber"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown table backend: {backend}")
+    return BACKENDS[backend](page)
+
+
+@contextmanager
+def open_pages(template, backend=None):
+    """
+    以指定后端打开模板的所有页面：pdfplumber 后端在同一份数据上打开 pdfplumber 文档，
+    pymupdf 后端直接使用已打开的 fitz 文档，不再解析第二遍。
+    :param template: PdfDocument
+    :param backend: 后端名称，默认取 TABLE_BACKEND
+    :return: 页面列表（可传给 page_tables）
+    :raises ValueError: 未知的后端
+    """
+    backend = backend or TABLE_BACKEND
+    if backend == "pdfplumber":
+        with template.open_plumber() as pdf:
+            yield pdf.pages
+    elif backend == "pymupdf":
+        yield [template.doc.load_page(page_num) for page_num in range(template.page_count)]
+    else:
+        raise ValueError(f"Unknown table backend: {backend}")
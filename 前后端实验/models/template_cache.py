@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import re
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from models.table_engine import TABLE_BACKEND
+from utils.pdf_utils import open_pdf
+
+# 访问时间先记在内存中，距上次写入元数据超过该秒数才写回磁盘，内存命中不必每次写文件
+TOUCH_FLUSH_INTERVAL = 60
+
+
+def hash_template(data):
+    """
+    计算模板 PDF 内容的哈希值，作为编译结果的缓存键。
+    :param data: 模板 PDF 的字节内容
+    :return: sha256 十六进制字符串
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class TemplateCache:
+    """
+    已编译模板的两级缓存：内存 LRU + 磁盘 LRU。
+    磁盘目录中每个模板保存三个文件：
+        <id>.pdf   模板原文件（扫描件处理时仍需渲染模板页面）
+        <id>.pkl   编译结果（表格、层级逻辑、灵活区域、表格范围）
+        <id>.json  元数据（文件名、页数、创建/访问时间）
+    """
+
+    def __init__(self, cache_dir, max_memory_entries=32, max_disk_entries=256):
+        """
+        :param cache_dir: 磁盘缓存目录
+        :param max_memory_entries: 内存中最多保留的编译结果数量
+        :param max_disk_entries: 磁盘上最多保留的模板数量
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        # {模板 id: 最近访问时间}，包括内存命中；淘汰磁盘条目时以它为准
+        self._last_used = {}
+        # {模板 id: 上次把访问时间写入元数据的时间}
+        self._flushed = {}
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def is_valid_id(template_id):
+        """
+        模板 id 必须是 sha256 十六进制串，防止通过 id 访问缓存目录之外的文件。
+        """
+        return bool(template_id) and re.fullmatch(r'[0-9a-f]{64}', template_id) is not None
+
+    def _path(self, template_id, suffix):
+        return os.path.join(self.cache_dir, f"{template_id}.{suffix}")
+
+    def template_path(self, template_id):
+        """
+        返回缓存中模板 PDF 的路径，不存在时返回 None。
+        """
+        if not self.is_valid_id(template_id):
+            return None
+        path = self._path(template_id, "pdf")
+        return path if os.path.exists(path) else None
+
+    def _remember(self, template_id, compiled):
+        self._memory[template_id] = compiled
+        self._memory.move_to_end(template_id)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, template_id):
+        """
+        记录一次访问：内存中的访问时间立即更新，元数据文件按 TOUCH_FLUSH_INTERVAL 延迟写回。
+        """
+        now = time.time()
+        self._last_used[template_id] = now
+        if now - self._flushed.get(template_id, 0) < TOUCH_FLUSH_INTERVAL:
+            return
+        self._flushed[template_id] = now
+        meta_path = self._path(template_id, "json")
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta["last_used"] = now
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, template_id):
+        """
+        读取编译结果：先查内存，再查磁盘，命中磁盘时回填内存。
+        :return: 编译结果字典，未命中返回 None
+        """
+        if not self.is_valid_id(template_id):
+            return None
+        with self._lock:
+            if template_id in self._memory:
+                self._memory.move_to_end(template_id)
+                self._touch(template_id)
+                return self._memory[template_id]
+
+            compiled_path = self._path(template_id, "pkl")
+            if not os.path.exists(compiled_path):
+                return None
+            try:
+                with open(compiled_path, 'rb') as f:
+                    compiled = pickle.load(f)
+            except Exception as e:
+                logging.warning(f"模板缓存 {template_id} 读取失败：{e}")
+                self.evict(template_id)
+                return None
+
+            self._remember(template_id, compiled)
+            self._touch(template_id)
+            return compiled
+
+    def put(self, template_id, compiled, data, name=None):
+        """
+        写入编译结果及模板原文件，并按最近使用时间淘汰多余的磁盘条目。
+        :param template_id: 模板哈希
+        :param compiled: 编译结果字典
+        :param data: 模板 PDF 的字节内容
+        :param name: 上传时的文件名，为 None 时沿用已有元数据中的文件名（重新编译时）
+        """
+        if name is None:
+            try:
+                with open(self._path(template_id, "json"), 'r', encoding='utf-8') as f:
+                    name = json.load(f).get("name")
+            except (OSError, ValueError):
+                pass
+        meta = {
+            "template_id": template_id,
+            "name": name,
+            "page_count": compiled.get("page_count"),
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            with open(self._path(template_id, "pdf"), 'wb') as f:
+                f.write(data)
+            with open(self._path(template_id, "pkl"), 'wb') as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self._path(template_id, "json"), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            self._remember(template_id, compiled)
+            self._last_used[template_id] = self._flushed[template_id] = meta["last_used"]
+            self._trim_disk()
+
+    def _trim_disk(self):
+        entries = self.list()
+        for meta in entries[self.max_disk_entries:]:
+            self.evict(meta["template_id"])
+
+    def list(self):
+        """
+        列出磁盘上的所有已编译模板，按最近使用时间倒序（含尚未写回磁盘的访问时间）。
+        :return: 元数据字典列表
+        """
+        entries = []
+        with self._lock:
+            for filename in os.listdir(self.cache_dir):
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.cache_dir, filename), 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                meta["in_memory"] = meta.get("template_id") in self._memory
+                meta["last_used"] = max(meta.get("last_used", 0), self._last_used.get(meta.get("template_id"), 0))
+                entries.append(meta)
+        entries.sort(key=lambda meta: meta.get("last_used", 0), reverse=True)
+        return entries
+
+    def evict(self, template_id):
+        """
+        从内存和磁盘中删除指定模板。
+        :return: 是否确实删除了内容
+        """
+        if not self.is_valid_id(template_id):
+            return False
+        removed = False
+        with self._lock:
+            if self._memory.pop(template_id, None) is not None:
+                removed = True
+            self._last_used.pop(template_id, None)
+            self._flushed.pop(template_id, None)
+            for suffix in ("pdf", "pkl", "json"):
+                path = self._path(template_id, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+        return removed
+
+    @staticmethod
+    def is_current(compiled, fingerprint=None):
+        """
+        判断缓存的编译结果是否仍然有效。
+        :param fingerprint: 当前的编译输入指纹（见 demo.compile_fingerprint）；为 None 时只检查表格抽取后端
+        """
+        if fingerprint is not None:
+            return compiled.get("fingerprint") == fingerprint
+        # 旧版缓存没有记录表格抽取后端，均由 pdfplumber 编译
+        return compiled.get("table_backend", "pdfplumber") == TABLE_BACKEND
+
+    def get_or_compile(self, pdf_path, compile_fn, name=None, fingerprint=None):
+        """
+        按模板内容哈希查找编译结果，未命中或编译输入已变化时调用 compile_fn 编译并写入缓存。
+        :param pdf_path: 模板 PDF 路径或已打开的 PdfDocument
+        :param compile_fn: 编译函数，接收 PDF 路径或 PdfDocument 并返回编译结果字典
+        :param name: 上传时的文件名
+        :param fingerprint: 当前的编译输入指纹，与缓存中记录的不同时重新编译
+        :return: (模板哈希, 编译结果字典)
+        """
+        with open_pdf(pdf_path) as template:
+            data = template.read_bytes()
+            template_id = hash_template(data)
+
+            compiled = self.get(template_id)
+            if compiled is not None and self.is_current(compiled, fingerprint):
+                logging.info(f"模板缓存命中：{template_id}")
+                return template_id, compiled
+
+            logging.info(f"模板缓存未命中，开始编译：{template_id}")
+            stale = compiled is not None
+            compiled = compile_fn(template)
+            # 编译输入变化后重新编译时沿用已有的文件名（此时 template 可能是缓存中的模板原文件）
+            self.put(template_id, compiled, data, name=name or (None if stale else template.name))
+            return template_id, compiled
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+文本层直读：数字化填写的“扫描件”带有真实的文本层时，不渲染、不矫正、不 OCR，
+以模板中的文字为锚点求出模板坐标到扫描页坐标的映射，按灵活区域单元格直接读取文字。
+文本层不可用的页返回 None，由调用方退回图像处理流程。
+"""
+import os
+from collections import Counter
+
+import numpy as np
+
+from utils.pdf_utils import open_pdf
+
+# 是否优先从文本层读取
+TEXT_LAYER = os.environ.get("TEXT_LAYER", "1") == "1"
+
+# 至少需要匹配到的锚点数量
+TEXT_LAYER_MIN_ANCHORS = int(os.environ.get("TEXT_LAYER_MIN_ANCHORS", 4))
+
+# 锚点拟合的最大残差（PDF 坐标单位），超过时视为扫描页与模板的版式对不上
+TEXT_LAYER_TOLERANCE = float(os.environ.get("TEXT_LAYER_TOLERANCE", 2.0))
+
+# 映射的缩放比例须在该范围内
+SCALE_RANGE = (0.5, 2.0)
+
+# 字体缺少 Unicode 映射时抽取出的替换字符，出现即视为文本层不可用
+REPLACEMENT_CHAR = "\ufffd"
+
+
+def unique_words(words):
+    """
+    :param words: page.get_text("words") 的结果
+    :return: {只出现一次的词: (x0, y0, x1, y1)}
+    """
+    counts = Counter(word[4] for word in words)
+    return {word[4]: tuple(word[:4]) for word in words if counts[word[4]] == 1}
+
+
+def page_anchors(page):
+    """
+    提取页面中只出现一次的词及其位置，作为对齐锚点。
+    :param page: fitz.Page
+    :return: {词: (x0, y0, x1, y1)}
+    """
+    return unique_words(page.get_text("words"))
+
+
+def compile_anchors(mode_path):
+    """
+    提取模板每一页的锚点，随编译后的模板一起缓存。
+    :param mode_path: 模板 PDF 路径或已打开的 PdfDocument
+    :return: {页码: page_anchors 的结果}
+    """
+    with open_pdf(mode_path) as mode:
+        return {page_num: page_anchors(mode.doc.load_page(page_num)) for page_num in range(mode.page_count)}
+
+
+def _fit_axis(src, dst):
+    """
+    最小二乘拟合 dst = scale * src + offset。
+    :return: (scale, offset, 各点残差)
+    """
+    design = np.stack([src, np.ones_like(src)], axis=1)
+    (scale, offset), *_ = np.linalg.lstsq(design, dst, rcond=None)
+    return scale, offset, np.abs(design @ (scale, offset) - dst)
+
+
+def fit_mapping(anchors, page_words, min_anchors=TEXT_LAYER_MIN_ANCHORS, tolerance=TEXT_LAYER_TOLERANCE):
+    """
+    用模板与扫描页共有的锚点拟合坐标映射 x' = sx * x + tx，y' = sy * y + ty。
+    填写内容恰好与模板文字相同时会产生错误的锚点，拟合一次后剔除残差过大的锚点再拟合。
+    :param anchors: 模板页的锚点（见 page_anchors）
+    :param page_words: 扫描页的锚点
+    :return: (sx, tx, sy, ty)；锚点不足或残差过大时返回 None
+    """
+    common = [text for text in anchors if text in page_words]
+    if len(common) < min_anchors:
+        return None
+    # 每个锚点取左上、右下两个角点
+    src = np.array([anchors[text] for text in common], dtype=np.float64)
+    dst = np.array([page_words[text] for text in common], dtype=np.float64)
+
+    mapping = []
+    for axis in (0, 1):
+        axis_src, axis_dst = src[:, [axis, axis + 2]], dst[:, [axis, axis + 2]]
+        scale, offset, residual = _fit_axis(axis_src.ravel(), axis_dst.ravel())
+        inliers = (residual.reshape(-1, 2) <= tolerance).all(axis=1)
+        if inliers.sum() < max(min_anchors, len(common) // 2):
+            return None
+        if not inliers.all():
+            scale, offset, residual = _fit_axis(axis_src[inliers].ravel(), axis_dst[inliers].ravel())
+        low, high = SCALE_RANGE
+        if residual.max() > tolerance or not low <= scale <= high:
+            return None
+        mapping += [scale, offset]
+    return tuple(mapping)
+
+
+def read_page(page, anchors, mode_page):
+    """
+    从扫描页的文本层直接读取灵活区域单元格的文字。
+    整页的词只抽取一次，每个词按其起始位置归入所在的单元格：写出单元格右边界的长文本仍属于它开始的单元格。
+    :param page: 扫描件 fitz.Page
+    :param anchors: 该页模板的锚点（见 compile_anchors）
+    :param mode_page: 该页模板的灵活区域 {(x0, y0, x1, y1): 逻辑链}
+    :return: {文本: 逻辑链}，空单元格的文本为 "none"；文本层不可用时返回 None
+    """
+    if not anchors:
+        return None
+    words = page.get_text("words")
+    mapping = fit_mapping(anchors, unique_words(words))
+    if mapping is None:
+        return None
+    sx, tx, sy, ty = mapping
+
+    cells = [(sx * x0 + tx, sy * y0 + ty, sx * x1 + tx, sy * y1 + ty) for x0, y0, x1, y1 in mode_page]
+    cell_words = [[] for _ in cells]
+    for word in words:
+        # 词的起始位置：左边界向内 1 个单位、垂直居中
+        x, y = word[0] + 1, (word[1] + word[3]) / 2
+        for idx, (x0, y0, x1, y1) in enumerate(cells):
+            if x0 <= x < x1 and y0 <= y < y1:
+                cell_words[idx].append(word[4])
+                break
+
+    texts = []
+    for words_in_cell in cell_words:
+        # 多行文字合并为一行，与 OCR 的输出一致
+        text = " ".join(words_in_cell)
+        if REPLACEMENT_CHAR in text:
+            return None
+        texts.append(text or "none")
+    return dict(zip(texts, mode_page.values()))
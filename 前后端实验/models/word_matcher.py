@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import threading
+
+
+def build_trie(words):
+    """
+    将词表构建为字符前缀树。
+    :param words: 词列表
+    :return: 嵌套字典形式的前缀树，空字符串键表示词在此结束
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+def trie_to_regex(node):
+    """
+    将前缀树转换为正则表达式，公共前缀只匹配一次，
+    单个位置的匹配代价与词长相关而与词表大小无关。
+    :param node: build_trie 生成的前缀树（或其子树）
+    :return: 正则表达式字符串
+    """
+    if '' in node and len(node) == 1:
+        return ''
+
+    branches = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        sub_pattern = trie_to_regex(node[char])
+        if sub_pattern:
+            branches.append(re.escape(char) + sub_pattern)
+        else:
+            single_chars.append(re.escape(char))
+
+    if single_chars:
+        branches.append(single_chars[0] if len(single_chars) == 1 else '[' + ''.join(single_chars) + ']')
+
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+class WordMatcher:
+    """
+    词表匹配器：从文件读取词表并编译为前缀树正则，匹配规则与
+    r'\\b(?:词1|词2|...)\\b'（忽略大小写）相同。
+    文件修改时间变化时自动重新加载。
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 词表文件路径，每行一个词
+        """
+        self.path = path
+        self.words = []
+        self.pattern = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """
+        检查词表文件的修改时间，有变化时重新读取并编译。
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                words = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+            self.pattern = re.compile(r'\b(?:' + trie_to_regex(build_trie(words)) + r')\b', re.IGNORECASE)
+            self.words = words
+            self._mtime = mtime
+
+    def search(self, text):
+        """
+        在文本中查找任意一个词。
+        :param text: 待匹配文本
+        :return: re.Match 对象，未命中返回 None
+        """
+        self.refresh()
+        return self.pattern.search(text)
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(path):
+    """
+    获取词表文件对应的匹配器，同一进程内每个文件只加载一次。
+    :param path: 词表文件路径
+    :return: WordMatcher 对象
+    """
+    key = os.path.abspath(path)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(key)
+            if matcher is None:
+                matcher = WordMatcher(key)
+                _matchers[key] = matcher
+    return matcher
@@ -1,19 +1,35 @@
 import os
+import tempfile
+from flask import Request
 from werkzeug.utils import secure_filename
 from utils.pdf_utils import validate_pdf
 
+# 上传文件在内存中保留的最大字节数，超过后溢出到临时文件（之后以内存映射方式读取）
+UPLOAD_SPOOL_SIZE = int(os.environ.get("UPLOAD_SPOOL_SIZE", 16 * 1024 * 1024))
 
-def save_file(file, upload_dir):
+
+class SpooledRequest(Request):
+    """
+    上传文件先保存在内存中，超过 UPLOAD_SPOOL_SIZE 才写入临时文件
+    （Werkzeug 默认超过 500KB 即写入临时文件）。
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE, mode="rb+")
+
+
+def save_file(file, upload_dir, filename=None):
     """
     保存上传的文件并验证是否为 PDF。
     确保目录存在且具有正确的权限。
+    :param filename: 保存的文件名，默认取上传时文件名的安全形式
     """
     # 创建上传目录并设置权限
     os.makedirs(upload_dir, exist_ok=True)
     os.chmod(upload_dir, 0o755)  # 授予读、写、执行权限
 
     # 构造文件路径
-    filepath = os.path.join(upload_dir, secure_filename(file.filename))
+    filepath = os.path.join(upload_dir, filename or secure_filename(file.filename))
 
     # 保存文件
     file.save(filepath)
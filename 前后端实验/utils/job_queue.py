@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import socket
+import shutil
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+from utils.file_processing import save_file
+
+# 任务租约时长（秒）：执行中的任务由所属进程定期续约，租约过期说明该进程已退出，任务重新排队
+JOB_LEASE = float(os.environ.get("JOB_LEASE", 60))
+
+
+class JobQueue:
+    """
+    基于 SQLite 的异步任务队列。
+    上传文件保存在 job_dir/<job_id>/ 下，任务状态与结果保存在 SQLite 中。
+    多个进程可以共用同一个数据库：任务以条件更新认领，执行中的任务记录所属的 worker 与租约，
+    只有租约过期（所属进程已退出）的任务才会重新排队执行。
+    已结束（完成或失败）超过 ttl 的任务记录连同其结果一起清理。
+    """
+
+    def __init__(self, db_path, job_dir, handler, workers=2, result_store=None, ttl=3600, sweep_interval=60):
+        """
+        :param db_path: SQLite 数据库文件路径
+        :param job_dir: 任务文件目录
+        :param handler: 任务处理函数 handler(job, progress) -> 结果，
+                        progress(pages_done, pages_total) 用于上报进度
+        :param workers: 工作线程数量
+        :param result_store: 结果存储（ResultStore），为 None 时结果直接保存在数据库中
+        :param ttl: 已结束任务的保留时间（秒），应与结果存储的 TTL 一致
+        :param sweep_interval: 两次过期清理之间的最短间隔（秒）
+        """
+        self.db_path = db_path
+        self.job_dir = job_dir
+        self.handler = handler
+        self.workers = workers
+        self.result_store = result_store
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0
+        # 本队列实例的标识，写入所认领任务的 worker 列
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        os.makedirs(job_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT, "
+                "pages_done INTEGER DEFAULT 0, pages_total INTEGER DEFAULT 0, "
+                "result TEXT, error TEXT, created REAL, updated REAL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "result_id" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN result_id TEXT")
+            if "worker" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+            if "lease" not in columns:
+                # 旧版本留下的执行中任务没有租约（NULL），视为已过期
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease REAL")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        """
+        启动工作线程与续约线程。中断的任务在租约过期后由认领时的检查重新排队。
+        """
+        for target in [self._worker] * self.workers + [self._renew_leases]:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, files, params=None):
+        """
+        提交任务：将上传文件直接保存到任务自己的目录（<角色>.pdf）并写入队列。
+        各任务的文件互不相同，与上传时的文件名无关；提交失败时删除任务目录。
+        :param files: {文件角色: 上传文件}，如 {"scan": ..., "template": ...}
+        :param params: 任务参数字典
+        :return: 任务 id
+        :raises ValueError: 上传文件不是有效的 PDF
+        """
+        job_id = uuid.uuid4().hex
+        job_path = os.path.join(self.job_dir, job_id)
+        os.makedirs(job_path, exist_ok=True)
+
+        try:
+            stored = {role: save_file(file, job_path, f"{role}.pdf") for role, file in files.items()}
+            params = dict(params or {}, files=stored)
+            now = time.time()
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, params, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(params, ensure_ascii=False), now, now),
+                )
+        except Exception:
+            shutil.rmtree(job_path, ignore_errors=True)
+            raise
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """
+        查询任务状态。
+        :return: 状态字典，任务不存在时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, pages_done, pages_total, result_id, error, created, updated "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "status", "pages_done", "pages_total", "result_id", "error", "created", "updated")
+        return dict(zip(keys, row))
+
+    def result(self, job_id):
+        """
+        读取已完成任务的结果。
+        :return: 结果对象，任务未完成或结果已过期时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, result, result_id FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] != 'done':
+            return None
+        if row[2] and self.result_store:
+            return self.result_store.load(row[2])
+        return json.loads(row[1]) if row[1] is not None else None
+
+    def _requeue_expired(self, conn):
+        """
+        将租约过期的执行中任务重新排队：所属进程已退出，不会再续约。
+        """
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease = NULL, updated = ? "
+            "WHERE status = 'running' AND (lease IS NULL OR lease < ?)",
+            (time.time(), time.time()),
+        ).rowcount
+        if requeued:
+            logging.warning(f"{requeued} 个中断的任务重新排队")
+
+    def _evict_expired(self, conn):
+        """
+        清理结束超过 TTL 的任务记录及其结果，两次清理至少间隔 sweep_interval 秒。
+        排队与执行中的任务不清理。
+        """
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        expired = conn.execute(
+            "SELECT id, result_id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+            (now - self.ttl,),
+        ).fetchall()
+        if not expired:
+            return
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id, _ in expired])
+        if self.result_store:
+            for _, result_id in expired:
+                if result_id:
+                    self.result_store.delete(result_id)
+        logging.info(f"清理 {len(expired)} 个过期任务")
+
+    def _claim(self):
+        """
+        认领最早排队的任务。其他进程可能同时认领同一行，以带状态条件的 UPDATE 认领，更新成功才算认领到。
+        :return: {"job_id", "params"}，没有可认领的任务时返回 None
+        """
+        with self._lock, self._connect() as conn:
+            self._requeue_expired(conn)
+            self._evict_expired(conn)
+            while True:
+                row = conn.execute(
+                    "SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease = ?, updated = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (self.worker_id, now + JOB_LEASE, now, row[0]),
+                ).rowcount
+                if claimed:
+                    return {"job_id": row[0], "params": json.loads(row[1])}
+
+    def _renew_leases(self):
+        """
+        续约线程：定期延长本实例执行中任务的租约。
+        """
+        while True:
+            time.sleep(JOB_LEASE / 3)
+            try:
+                with self._lock, self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET lease = ? WHERE worker = ? AND status = 'running'",
+                        (time.time() + JOB_LEASE, self.worker_id),
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"任务续约失败：{e}")
+
+    def _update(self, job_id, **fields):
+        """
+        更新本实例执行中的任务。租约过期后任务可能已被其他进程重新认领，此时不再更新。
+        :return: 是否更新成功（任务仍归本实例所有）
+        """
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ? AND worker = ? AND status = 'running'",
+                (*fields.values(), job_id, self.worker_id),
+            ).rowcount > 0
+
+    def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1)
+                continue
+
+            job_id = job["job_id"]
+            logging.info(f"开始执行任务 {job_id}")
+
+            def progress(pages_done, pages_total):
+                self._update(job_id, pages_done=pages_done, pages_total=pages_total)
+
+            result_id = None
+            try:
+                result = self.handler(job, progress)
+                if result is None:
+                    raise RuntimeError("处理流程未返回结果")
+                if self.result_store:
+                    result_id = self.result_store.save(result)
+                    finished = self._update(job_id, status='done', result_id=result_id)
+                else:
+                    finished = self._update(job_id, status='done', result=json.dumps(result, ensure_ascii=False))
+            except Exception as e:
+                logging.error(f"任务 {job_id} 执行失败：{e}")
+                finished = self._update(job_id, status='failed', error=str(e))
+
+            if finished:
+                shutil.rmtree(os.path.join(self.job_dir, job_id), ignore_errors=True)
+            else:
+                # 租约已过期，任务已由其他进程重新认领：结果以对方为准，任务文件留给对方使用
+                logging.warning(f"任务 {job_id} 的租约已失效，丢弃本次结果")
+                if result_id:
+                    self.result_store.delete(result_id)
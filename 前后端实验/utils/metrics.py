@@ -0,0 +1,279 @@
+import io
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument 为可选依赖
+    pyinstrument = None
+
+# 处理流程的各个阶段
+STAGES = (
+    "table_extraction",   # 模板表格抽取
+    "hierarchy_search",   # 层级逻辑查找
+    "flexible_area",      # 灵活区域推导
+    "instance_detection", # 多实例扫描件的实例边界识别
+    "text_layer",         # 文本层直读
+    "render",             # 页面渲染
+    "border_detection",   # 边界检测
+    "feature_alignment",  # 特征匹配对齐
+    "warp",               # 透视矫正
+    "blank_detection",    # 空白单元格检测
+    "ocr",                # 单元格识别
+    "tree_build",         # 逻辑树构建
+)
+
+
+class Timings:
+    """
+    单个请求的分阶段耗时：每个阶段的墙钟时间、CPU 时间（调用线程）与调用次数，
+    以及按页汇总的同样数据和计数（单元格数、OCR 调用次数等）。
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.pages = {}
+        self.wall = 0.0
+        self._depth = 0
+
+    def _page(self, page):
+        return self.pages.setdefault(page, {"stages": {}, "counters": {}})
+
+    @staticmethod
+    def _add_stage(stages, stage, wall, cpu, calls=1):
+        entry = stages.setdefault(stage, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        entry["calls"] += calls
+
+    def add(self, stage, wall, cpu, page=None, calls=1):
+        self._add_stage(self.stages, stage, wall, cpu, calls)
+        if page is not None:
+            self._add_stage(self._page(page)["stages"], stage, wall, cpu, calls)
+
+    def count(self, name, value=1, page=None):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if page is not None:
+            counters = self._page(page)["counters"]
+            counters[name] = counters.get(name, 0) + value
+
+    def merge(self, data):
+        """
+        合并其他进程中记录的耗时（to_dict 的结果）。
+        """
+        for stage, entry in data["stages"].items():
+            self.add(stage, entry["wall"], entry["cpu"], calls=entry["calls"])
+        for name, value in data["counters"].items():
+            self.count(name, value)
+        for page, page_data in data["pages"].items():
+            target = self._page(page)
+            for stage, entry in page_data["stages"].items():
+                self._add_stage(target["stages"], stage, entry["wall"], entry["cpu"], entry["calls"])
+            for name, value in page_data["counters"].items():
+                target["counters"][name] = target["counters"].get(name, 0) + value
+
+    def to_dict(self):
+        def rounded(stages):
+            return {
+                stage: {"wall": round(entry["wall"], 6), "cpu": round(entry["cpu"], 6), "calls": entry["calls"]}
+                for stage, entry in stages.items()
+            }
+
+        return {
+            "wall": round(self.wall, 6),
+            "stages": rounded(self.stages),
+            "counters": dict(self.counters),
+            "pages": {
+                page: {"stages": rounded(data["stages"]), "counters": dict(data["counters"])}
+                for page, data in sorted(self.pages.items())
+            },
+        }
+
+
+class MetricsRegistry:
+    """
+    进程内累计的处理指标，以 Prometheus 文本格式导出。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.requests = 0
+        self.request_seconds = 0.0
+
+    def observe(self, stage, wall, cpu, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+            entry["wall"] += wall
+            entry["cpu"] += cpu
+            entry["calls"] += calls
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_request(self, wall):
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += wall
+
+    def to_prometheus(self, gauges=None):
+        """
+        :param gauges: 额外导出的即时值 {指标名: 数值}
+        :return: Prometheus 文本格式
+        """
+        with self._lock:
+            stages = {stage: dict(entry) for stage, entry in self.stages.items()}
+            counters = dict(self.counters)
+            requests, request_seconds = self.requests, self.request_seconds
+
+        lines = [
+            "# HELP pipeline_requests_total Processed requests.",
+            "# TYPE pipeline_requests_total counter",
+            f"pipeline_requests_total {requests}",
+            "# HELP pipeline_request_seconds_total Wall time spent processing requests.",
+            "# TYPE pipeline_request_seconds_total counter",
+            f"pipeline_request_seconds_total {request_seconds:.6f}",
+        ]
+        for metric, key, help_text in (
+            ("pipeline_stage_seconds_total", "wall", "Wall time spent per pipeline stage."),
+            ("pipeline_stage_cpu_seconds_total", "cpu", "CPU time spent per pipeline stage."),
+            ("pipeline_stage_calls_total", "calls", "Number of times each pipeline stage ran."),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for stage in sorted(stages):
+                value = stages[stage][key]
+                lines.append(f'{metric}{{stage="{stage}"}} {value:.6f}' if key != "calls"
+                             else f'{metric}{{stage="{stage}"}} {value}')
+        for name in sorted(counters):
+            lines.append(f"# TYPE pipeline_{name}_total counter")
+            lines.append(f"pipeline_{name}_total {counters[name]}")
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+_current = contextvars.ContextVar("pipeline_timings", default=None)
+
+
+@contextmanager
+def stage(name, page=None):
+    """
+    记录一个阶段的墙钟时间与调用线程的 CPU 时间，计入进程累计指标与当前请求。
+    :param name: 阶段名（见 STAGES）
+    :param page: 页码，可选
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        REGISTRY.observe(name, wall, cpu)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, wall, cpu, page=page)
+
+
+def count(name, value=1, page=None):
+    """
+    累加计数（如 cells、ocr_calls）。
+    """
+    REGISTRY.count(name, value)
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, value, page=page)
+
+
+@contextmanager
+def collect():
+    """
+    在当前上下文中收集耗时，不计入请求数。用于工作进程内的单页任务。
+    :return: Timings
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def merge(data):
+    """
+    合并工作进程返回的耗时（Timings.to_dict 的结果）到进程累计指标与当前请求。
+    """
+    for stage_name, entry in data["stages"].items():
+        REGISTRY.observe(stage_name, entry["wall"], entry["cpu"], entry["calls"])
+    for name, value in data["counters"].items():
+        REGISTRY.count(name, value)
+    timings = _current.get()
+    if timings is not None:
+        timings.merge(data)
+
+
+@contextmanager
+def track_request():
+    """
+    记录一次处理请求。嵌套调用时沿用外层的 Timings，请求只计一次。
+    :return: Timings
+    """
+    timings = _current.get()
+    token = None
+    if timings is None:
+        timings = Timings()
+        token = _current.set(timings)
+
+    timings._depth += 1
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings._depth -= 1
+        if timings._depth == 0:
+            timings.wall = time.perf_counter() - start
+            REGISTRY.observe_request(timings.wall)
+        if token is not None:
+            _current.reset(token)
+
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def profile_call(profiler, func, *args, **kwargs):
+    """
+    在性能分析器下执行一次调用。
+    :param profiler: "cprofile" 或 "pyinstrument"
+    :return: (调用结果, 分析报告文本)
+    :raises ValueError: 未知的分析器或未安装 pyinstrument
+    """
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        result = profile.runcall(func, *args, **kwargs)
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(50)
+        return result, output.getvalue()
+
+    if profiler == "pyinstrument":
+        if pyinstrument is None:
+            raise ValueError("pyinstrument is not installed")
+        profile = pyinstrument.Profiler()
+        profile.start()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.stop()
+        return result, profile.output_text(unicode=True)
+
+    raise ValueError(f"Unknown profiler: {profiler}")
@@ -1,12 +1,200 @@
 # utils/pdf_utils.py
+import io
+import os
+import mmap
+import tempfile
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+import numpy as np
+import pdfplumber
+
+
+class PixmapArray(np.ndarray):
+    """
+    直接引用 fitz.Pixmap 像素缓冲区的 numpy 数组。
+    数组持有 Pixmap 的引用，保证切片等视图在使用期间底层缓冲区不被释放。
+    """
+    pixmap = None
+
+    def __array_finalize__(self, obj):
+        # 切片等视图沿用原数组的 Pixmap 引用
+        self.pixmap = getattr(obj, "pixmap", None)
+
+
+def pixmap_to_array(pix):
+    """
+    将 fitz.Pixmap 包装为 (高, 宽, 通道) 的 uint8 数组视图，不经过 PIL 或图片编解码，也不复制像素。
+    :param pix: fitz.Pixmap 对象
+    :return: PixmapArray，通道顺序与 Pixmap 相同（默认 RGB）
+    """
+    buffer = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    array = np.lib.stride_tricks.as_strided(
+        buffer, shape=(pix.height, pix.width, pix.n), strides=(pix.stride, pix.n, 1), writeable=False
+    ).view(PixmapArray)
+    array.pixmap = pix
+    return array
+
+
+def render_page(page, dpi=None, clip=None):
+    """
+    渲染 PDF 页面并返回像素数组视图。
+    :param page: fitz.Page 对象
+    :param dpi: 渲染分辨率，None 时使用 PyMuPDF 默认值（72 dpi）
+    :param clip: 只渲染该矩形区域（页面坐标），None 时渲染整页
+    :return: PixmapArray（RGB）
+    """
+    kwargs = {}
+    if dpi:
+        kwargs["dpi"] = dpi
+    if clip is not None:
+        kwargs["clip"] = clip
+    return pixmap_to_array(page.get_pixmap(**kwargs))
+
+
+class PdfDocument:
+    """
+    只解析一次的 PDF 文档。
+    数据来自文件路径、内存中的字节或内存映射的临时文件；构造时用 PyMuPDF 打开并校验，
+    之后的渲染（.doc）与表格抽取（open_plumber）都复用这一份数据，不再重新读取文件。
+    """
+
+    def __init__(self, data=None, path=None, name=None):
+        """
+        :param data: PDF 内容（bytes 或 memoryview），与 path 二选一
+        :param path: PDF 文件路径
+        :param name: 上传时的文件名
+        :raises ValueError: 不是有效的 PDF 文件
+        """
+        self.data = data
+        self.path = path
+        self.name = name
+        self._mmap = None
+        self._spill_path = None
+        try:
+            self.doc = fitz.open(path) if data is None else fitz.open(stream=data, filetype="pdf")
+        except Exception as e:
+            raise ValueError("Invalid PDF file") from e
+        if not self.doc.is_pdf or self.doc.page_count == 0:
+            self.doc.close()
+            raise ValueError("Invalid PDF file")
+
+    @classmethod
+    def from_mmap(cls, buffer, name=None):
+        """
+        在内存映射上打开文档，文档关闭时一并释放映射。
+        """
+        view = memoryview(buffer)
+        try:
+            pdf = cls(view, name=name)
+        except ValueError:
+            view.release()
+            buffer.close()
+            raise
+        pdf._mmap = buffer
+        return pdf
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    def read_bytes(self):
+        """
+        :return: PDF 的原始内容（用于计算哈希或写入缓存）
+        """
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open_plumber(self):
+        """
+        在同一份数据上打开 pdfplumber 文档，调用方负责关闭。
+        """
+        if self.data is None:
+            return pdfplumber.open(self.path)
+        if self._mmap is not None:
+            self._mmap.seek(0)
+            return pdfplumber.open(self._mmap)
+        return pdfplumber.open(io.BytesIO(self.data))
+
+    def local_path(self):
+        """
+        获取文档在磁盘上的路径，供其他进程打开。内存中的文档在第一次调用时写入临时文件，关闭时删除。
+        """
+        if self.path is not None:
+            return self.path
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.data)
+        return self._spill_path
+
+    def close(self):
+        self.doc.close()
+        if self._mmap is not None:
+            self.data.release()
+            self._mmap.close()
+            self._mmap = None
+        if self._spill_path is not None:
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
+            self._spill_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def open_pdf(source):
+    """
+    以 PdfDocument 形式使用 PDF：传入路径时在此打开并在退出时关闭，
+    传入已打开的 PdfDocument 时直接使用，由调用方负责关闭。
+    :param source: PDF 路径或 PdfDocument
+    """
+    if isinstance(source, PdfDocument):
+        yield source
+        return
+    pdf = PdfDocument(path=source)
+    try:
+        yield pdf
+    finally:
+        pdf.close()
+
+
+def read_upload(file):
+    """
+    将上传文件解析为 PdfDocument，不写入 uploads 目录。
+    内存中的上传直接使用其字节，已溢出到临时文件的上传以内存映射方式打开。
+    :param file: werkzeug FileStorage
+    :return: PdfDocument
+    :raises ValueError: 不是有效的 PDF 文件
+    """
+    stream = file.stream
+    stream.seek(0)
+    # SpooledTemporaryFile 的底层文件：未溢出时是 BytesIO，溢出后是磁盘上的临时文件
+    raw = getattr(stream, "_file", stream)
+    if isinstance(raw, io.BytesIO):
+        return PdfDocument(raw.getvalue(), name=file.filename)
+    try:
+        fileno = raw.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return PdfDocument(stream.read(), name=file.filename)
+    raw.flush()
+    if os.fstat(fileno).st_size == 0:
+        raise ValueError("Invalid PDF file")
+    return PdfDocument.from_mmap(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ), name=file.filename)
+
+
 def validate_pdf(file_path):
     """验证文件是否为有效的 PDF 文件"""
     try:
-        import PyPDF2
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            if len(reader.pages) > 0:
-                return True
-    except Exception:
+        PdfDocument(path=file_path).close()
+    except ValueError:
         return False
-    return False
\ No newline at end of file
+    return True
@@ -0,0 +1,179 @@
+import io
+import os
+import json
+import gzip
+import time
+import uuid
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选依赖
+    zstandard = None
+
+# 压缩方式与文件后缀、Content-Encoding 的对应关系
+SUFFIXES = {
+    None: ".json",
+    "gzip": ".json.gz",
+    "zstd": ".json.zst",
+}
+
+
+class ResultStore:
+    """
+    处理结果存储：每个请求的结果单独保存为一个文件，以唯一 id 访问。
+    结果以流式方式写入（可选 gzip / zstd 压缩），超过 TTL 的结果会被自动清理。
+    """
+
+    def __init__(self, result_dir, ttl=3600, compression="gzip", sweep_interval=60):
+        """
+        :param result_dir: 结果文件目录
+        :param ttl: 结果保留时间（秒）
+        :param compression: 压缩方式，None / "gzip" / "zstd"
+        :param sweep_interval: 两次过期清理之间的最短间隔（秒）
+        """
+        if compression == "zstd" and zstandard is None:
+            logging.warning("未安装 zstandard，结果存储改用 gzip 压缩")
+            compression = "gzip"
+        if compression not in SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+        self.result_dir = os.path.abspath(result_dir)
+        self.ttl = ttl
+        self.compression = compression
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+        os.makedirs(result_dir, exist_ok=True)
+
+    @staticmethod
+    def is_valid_id(result_id):
+        return bool(result_id) and len(result_id) == 32 and all(c in "0123456789abcdef" for c in result_id)
+
+    def _open_writer(self, path):
+        if self.compression == "gzip":
+            return gzip.open(path, 'wt', encoding='utf-8')
+        if self.compression == "zstd":
+            raw = open(path, 'wb')
+            return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+
+    def save(self, result):
+        """
+        将结果流式写入新文件。
+        :param result: 可 JSON 序列化的结果
+        :return: 结果 id
+        """
+        self.evict_expired()
+
+        result_id = uuid.uuid4().hex
+        path = os.path.join(self.result_dir, result_id + SUFFIXES[self.compression])
+        tmp_path = path + ".tmp"
+        with self._open_writer(tmp_path) as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return result_id
+
+    def locate(self, result_id):
+        """
+        查找结果文件。
+        :return: (文件路径, 压缩方式)，不存在或已过期时返回 (None, None)
+        """
+        if not self.is_valid_id(result_id):
+            return None, None
+        for compression, suffix in SUFFIXES.items():
+            path = os.path.join(self.result_dir, result_id + suffix)
+            if os.path.exists(path):
+                if time.time() - os.path.getmtime(path) > self.ttl:
+                    self._remove(path)
+                    return None, None
+                return path, compression
+        return None, None
+
+    def open(self, result_id):
+        """
+        以解压后的二进制流打开结果。
+        :return: 文件对象，结果不存在时返回 None
+        """
+        path, compression = self.locate(result_id)
+        if path is None:
+            return None
+        if compression == "gzip":
+            return gzip.open(path, 'rb')
+        if compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this result")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return open(path, 'rb')
+
+    def size(self, result_id):
+        """
+        结果解压后的字节数。gzip 直接读取文件末尾记录的原始长度（模 2^32，结果远小于 4 GiB），
+        zstd 读取帧头中的内容长度，未记录时解压计数。
+        :return: 字节数，结果不存在时返回 None
+        """
+        path, compression = self.locate(result_id)
+        if path is None:
+            return None
+        if compression == "gzip":
+            with open(path, 'rb') as f:
+                f.seek(-4, os.SEEK_END)
+                return int.from_bytes(f.read(4), 'little')
+        if compression == "zstd" and zstandard is not None:
+            with open(path, 'rb') as f:
+                content_size = zstandard.frame_content_size(f.read(18))
+            if content_size >= 0:
+                return content_size
+        if compression is None:
+            return os.path.getsize(path)
+        with self.open(result_id) as f:
+            return sum(len(chunk) for chunk in iter(lambda: f.read(64 * 1024), b''))
+
+    def load(self, result_id):
+        """
+        读取并解析结果。
+        :return: 结果对象，不存在时返回 None
+        """
+        f = self.open(result_id)
+        if f is None:
+            return None
+        with f:
+            return json.load(io.TextIOWrapper(f, encoding='utf-8'))
+
+    def delete(self, result_id):
+        path, _ = self.locate(result_id)
+        if path:
+            self._remove(path)
+            return True
+        return False
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict_expired(self, force=False):
+        """
+        清理超过 TTL 的结果文件，两次清理至少间隔 sweep_interval 秒。
+        :param force: 忽略清理间隔立即执行
+        :return: 删除的文件数量
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < self.sweep_interval:
+                return 0
+            self._last_sweep = now
+
+        removed = 0
+        for filename in os.listdir(self.result_dir):
+            path = os.path.join(self.result_dir, filename)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed